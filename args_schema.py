@@ -0,0 +1,134 @@
+import types
+import typing
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+from .args_dict import args_dict
+
+_TRUE = {"true", "1", "yes", "y", "on"}
+_FALSE = {"false", "0", "no", "n", "off"}
+
+
+class ArgError(ValueError):
+    """表情参数不合法"""
+
+
+@dataclass(frozen=True)
+class ArgField:
+    """单个参数：名称、类型、可选值与中文别名"""
+
+    name: str
+    kind: Literal["bool", "int", "float", "str", "other"]
+    description: str = ""
+    default: Any = None
+    choices: tuple[str, ...] = ()
+    aliases: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        return self.description or self.name
+
+    def coerce(self, text: str) -> Any:
+        """将用户输入转换为参数值"""
+        text = self.aliases.get(text, text)
+        if self.choices:
+            if text not in self.choices:
+                shown = "/".join(self._display_choices())
+                raise ArgError(f"参数 {self.label} 不支持 {text}，可选值: {shown}")
+            return text
+        if self.kind == "bool":
+            lowered = text.lower()
+            if lowered in _TRUE:
+                return True
+            if lowered in _FALSE:
+                return False
+            raise ArgError(f"参数 {self.label} 只能为 是/否")
+        if self.kind in ("int", "float"):
+            try:
+                return int(text) if self.kind == "int" else float(text)
+            except ValueError:
+                raise ArgError(f"参数 {self.label} 需要数字，收到 {text}") from None
+        return text
+
+    def _display_choices(self) -> list[str]:
+        # 优先展示中文别名
+        reverse = {value: alias for alias, value in self.aliases.items()}
+        return [reverse.get(choice, choice) for choice in self.choices]
+
+    def describe(self) -> str:
+        """用于帮助信息的描述"""
+        text = f"- {self.description or '无描述'} (默认为 {self.default}"
+        if self.choices:
+            text += f"，可选 {'/'.join(self._display_choices())}"
+        return text + ")"
+
+
+def _unwrap(annotation: Any) -> Any:
+    """去掉 Optional[...]"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union or (hasattr(types, "UnionType") and origin is types.UnionType):
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return _unwrap(args[0])
+    return annotation
+
+
+def _build_field(name: str, model_field: Any) -> ArgField:
+    annotation = _unwrap(
+        getattr(model_field, "annotation", None) or getattr(model_field, "outer_type_", None)
+    )
+    description = getattr(model_field, "description", None) or ""
+    default = getattr(model_field, "default", None)
+
+    choices: tuple[str, ...] = ()
+    if typing.get_origin(annotation) is Literal:
+        choices = tuple(str(c) for c in typing.get_args(annotation))
+        kind = "str"
+    elif annotation is bool:
+        kind = "bool"
+    elif annotation is int:
+        kind = "int"
+    elif annotation is float:
+        kind = "float"
+    elif annotation is str:
+        kind = "str"
+    else:
+        kind = "other"
+
+    if choices:
+        aliases = {alias: value for alias, value in args_dict.items() if value in choices}
+    elif kind == "bool":
+        aliases = {alias: value for alias, value in args_dict.items() if value in ("True", "False")}
+    else:
+        aliases = dict(args_dict)
+    return ArgField(name, kind, description, default, choices, aliases)  # type: ignore
+
+
+@dataclass(frozen=True)
+class ArgSchema:
+    """预编译的表情参数表，按位置解析用户输入"""
+
+    fields: tuple[ArgField, ...] = ()
+
+    @classmethod
+    def from_args_type(cls, args_type: Any) -> "ArgSchema":
+        if not args_type:
+            return cls()
+        model = args_type.args_model
+        model_fields = getattr(model, "model_fields", None) or model.__fields__
+        # 与原先一致：只取表情自身声明的参数，按声明顺序
+        return cls(
+            tuple(
+                _build_field(name, model_fields[name])
+                for name in model.__annotations__
+                if name in model_fields
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def parse(self, index: int, text: str) -> tuple[str, Any]:
+        """解析第 index 个位置参数"""
+        arg = self.fields[index]
+        return arg.name, arg.coerce(text)
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from astrbot import logger
+
+from .cache import BlobStore, ByteLRU, Singleflight, run_background
+
+
+class AvatarCache:
+    """头像缓存：内存 LRU + 磁盘内容寻址存储
+
+    - 未过期 (ttl 内) 直接返回
+    - 过期但仍在 stale 窗口内时先返回旧头像，同时在后台刷新
+    - 同一用户的并发未命中只会触发一次下载
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[bytes | None]],
+        cache_dir: Path | None,
+        ttl: float = 6 * 3600,
+        stale_ttl: float = 7 * 24 * 3600,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+    ):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._memory: ByteLRU[str, tuple[bytes, float]] = ByteLRU(max_memory_bytes)
+        self._disk = BlobStore(cache_dir) if cache_dir else None
+        self._flight: Singleflight[str, bytes | None] = Singleflight()
+
+    async def get(self, user_id: str) -> bytes | None:
+        """获取头像"""
+        entry = self._memory.get(user_id)
+        if entry is None and self._disk:
+            entry = await asyncio.to_thread(self._disk.read, user_id)
+            if entry:
+                self._memory.put(user_id, entry, len(entry[0]))
+
+        if entry:
+            data, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                return data
+            if age < self.ttl + self.stale_ttl:
+                if user_id not in self._flight:
+                    run_background(self._flight.do(user_id, lambda: self._refresh(user_id)))
+                return data
+
+        return await self._flight.do(user_id, lambda: self._refresh(user_id))
+
+    async def _refresh(self, user_id: str) -> bytes | None:
+        data = await self._fetch(user_id)
+        if not data:
+            # 下载失败时退回旧头像
+            entry = self._memory.get(user_id)
+            return entry[0] if entry else None
+        self._memory.put(user_id, (data, time.time()), len(data))
+        if self._disk:
+            try:
+                await asyncio.to_thread(self._disk.write, user_id, data)
+            except OSError as e:
+                logger.warning(f"头像写入磁盘缓存失败: {e}")
+        return data
+
+    async def prune(self) -> int:
+        """清理磁盘上完全过期的头像"""
+        if not self._disk:
+            return 0
+        return await asyncio.to_thread(self._disk.prune, self.ttl + self.stale_ttl)
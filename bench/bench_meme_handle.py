@@ -0,0 +1,476 @@
+"""MemePlugin.meme_handle 离线基准测试
+
+以伪造的 AstrMessageEvent 驱动完整的 meme_handle 流程，头像与图片由本地 HTTP 服务提供，
+不访问外网。需要在已安装 AstrBot 与 meme_generator 的环境中运行:
+
+    python bench/bench_meme_handle.py --output bench/results/run.json
+    python bench/bench_meme_handle.py --compare bench/results/old.json bench/results/new.json
+
+输出各场景的吞吐量、端到端延迟分位数、峰值内存 (RSS)，以及全部表情的单次合成耗时。
+"""
+
+import argparse
+import asyncio
+import importlib
+import io
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+from typing import Any
+
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_plugin_module():
+    """将仓库目录作为包导入，使 main.py 中的相对导入可用"""
+    package = types.ModuleType("memelite")
+    package.__path__ = [str(ROOT)]  # type: ignore
+    sys.modules["memelite"] = package
+    return importlib.import_module("memelite.main")
+
+
+main = load_plugin_module()
+Comp = main.Comp
+
+
+def make_image(seed: int, size: int = 640, fmt: str = "PNG", frames: int = 1) -> bytes:
+    """生成确定性的测试图片"""
+    rng = random.Random(seed)
+    images = []
+    for i in range(frames):
+        img = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(8):
+            x, y = rng.randrange(size), rng.randrange(size)
+            r = rng.randrange(size // 8, size // 3)
+            draw.ellipse(
+                (x - r + i * 4, y - r, x + r + i * 4, y + r),
+                fill=tuple(rng.randrange(256) for _ in range(3)),
+            )
+        images.append(img)
+    output = io.BytesIO()
+    if frames > 1:
+        images[0].save(output, format="GIF", save_all=True, append_images=images[1:], duration=60)
+    else:
+        images[0].save(output, format=fmt)
+    return output.getvalue()
+
+
+class FakeServer:
+    """本地替身：qlogo 头像与消息图片"""
+
+    def __init__(self):
+        self.avatars: dict[str, bytes] = {}
+        self.images = {
+            "photo.jpg": make_image(1, 1200, "JPEG"),
+            "anim.gif": make_image(2, 320, frames=12),
+        }
+        self.requests = 0
+        self.runner: web.AppRunner | None = None
+        self.port = 0
+
+    async def _avatar(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        uin = request.query.get("dst_uin", "0")
+        if uin not in self.avatars:
+            self.avatars[uin] = make_image(int(uin) % 100000)
+        return web.Response(body=self.avatars[uin], content_type="image/png")
+
+    async def _image(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        name = request.match_info["name"]
+        if name not in self.images:
+            raise web.HTTPNotFound()
+        return web.Response(body=self.images[name])
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/headimg_dl", self._avatar)
+        app.router.add_get("/img/{name}", self._image)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+
+class FakeEvent:
+    """AstrMessageEvent 的最小替身"""
+
+    def __init__(self, chain: list, sender_id: str = "10001", self_id: str = "99999"):
+        self.chain = chain
+        self.sender_id = sender_id
+        self.self_id = self_id
+        self.message_str = " ".join(
+            seg.text for seg in chain if isinstance(seg, Comp.Plain)
+        ).strip()
+
+    def get_messages(self):
+        return self.chain
+
+    def get_message_str(self):
+        return self.message_str
+
+    def get_sender_id(self):
+        return self.sender_id
+
+    def get_self_id(self):
+        return self.self_id
+
+    def get_sender_name(self):
+        return "bench"
+
+    def get_platform_name(self):
+        return "bench"
+
+    def get_group_id(self):
+        return "20001"
+
+    def plain_result(self, text: str):
+        return ("plain", text)
+
+    def chain_result(self, chain: list):
+        return ("chain", chain)
+
+
+class FakeConfig(dict):
+    def save_config(self, replace_config=None):
+        pass
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def _worker_pids(plugin) -> list[int]:
+    """进程池中仍在运行的渲染子进程"""
+    executor = plugin.render_engine._executor
+    processes = getattr(executor, "_processes", None) or {}
+    return list(processes)
+
+
+def _vm_hwm_mb(pid: int) -> float | None:
+    """从 /proc/<pid>/status 读取进程的峰值 RSS (VmHWM)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def peak_rss_mb(plugin) -> dict[str, Any]:
+    """本进程与渲染子进程的峰值 RSS
+
+    RUSAGE_CHILDREN 只统计已退出并被回收的子进程，进程池中的工作进程此时仍在运行，
+    因此在其存活时逐个读取 /proc 中的 VmHWM (仅 Linux)。
+    """
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    workers = {pid: _vm_hwm_mb(pid) for pid in _worker_pids(plugin)}
+    known = [mb for mb in workers.values() if mb is not None]
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "workers": list(workers.values()),
+        "workers_total": round(sum(known), 1) if known else None,
+    }
+
+
+async def drive(plugin, event: FakeEvent) -> list:
+    return [result async for result in plugin.meme_handle(event)]
+
+
+async def run_scenario(plugin, events: list[FakeEvent], concurrency: int) -> dict[str, Any]:
+    """以给定并发数发送消息，统计吞吐量与端到端延迟"""
+    latencies: list[float] = []
+    outputs = 0
+    queue: asyncio.Queue[FakeEvent] = asyncio.Queue()
+    for event in events:
+        queue.put_nowait(event)
+
+    async def worker():
+        nonlocal outputs
+        while not queue.empty():
+            event = queue.get_nowait()
+            start = time.perf_counter()
+            results = await drive(plugin, event)
+            latencies.append((time.perf_counter() - start) * 1000)
+            outputs += sum(1 for kind, _ in results if kind == "chain")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "messages": len(events),
+        "replies": outputs,
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round(len(events) / elapsed, 1) if elapsed else None,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def pick_meme(plugin, predicate) -> tuple[Any, str] | None:
+    for info in plugin.registry.infos:
+        if info.keywords and predicate(info.params):
+            return info, info.keywords[0]
+    return None
+
+
+async def registry_sweep(plugin) -> dict[str, Any]:
+    """逐个合成全部表情，记录单次合成耗时与输出格式"""
+    avatars = [make_image(i) for i in range(8)]
+    results: dict[str, Any] = {}
+    for meme in await plugin.registry.load():
+        params = plugin.registry.params(meme)
+        images = avatars[: params.min_images]
+        texts = list(params.default_texts)[: params.max_texts]
+        if len(texts) < params.min_texts:
+            texts += ["基准测试"] * (params.min_texts - len(texts))
+        start = time.perf_counter()
+        try:
+            data = await plugin.render_engine.render(meme, images, texts, {})
+        except Exception as e:
+            results[meme.key] = {"error": str(e)[:200]}
+            continue
+        elapsed = (time.perf_counter() - start) * 1000
+        fmt = Image.open(io.BytesIO(data)).format
+        results[meme.key] = {"ms": round(elapsed, 1), "bytes": len(data), "format": fmt}
+    return results
+
+
+def build_events(plugin, server: FakeServer, args) -> dict[str, tuple[list[FakeEvent], bool]]:
+    """构造各场景的消息，值为 (消息列表, 是否模糊匹配)"""
+    n = args.messages
+    rng = random.Random(0)
+    chatter = ["今天吃什么", "哈哈哈哈哈", "有人打游戏吗", "晚安", "这个怎么弄啊 求助"]
+
+    single = pick_meme(plugin, lambda p: p.min_images == 1 and p.min_texts == 0)
+    multi = pick_meme(plugin, lambda p: p.max_images >= 2 and p.min_texts == 0)
+    if not single or not multi:
+        raise SystemExit("未找到合适的表情用于基准测试")
+    single_kw, multi_kw = single[1], multi[1]
+    image_url = server.url("/img/photo.jpg")
+
+    def target() -> str:
+        return str(rng.randrange(100000, 100000 + args.targets))
+
+    scenarios: dict[str, tuple[list[FakeEvent], bool]] = {
+        "chatter": ([FakeEvent([Comp.Plain(rng.choice(chatter))]) for _ in range(n * 20)], False),
+        "chatter_fuzzy": (
+            [FakeEvent([Comp.Plain(rng.choice(chatter))]) for _ in range(n * 20)],
+            True,
+        ),
+        "exact": (
+            [FakeEvent([Comp.Plain(f"{single_kw} "), Comp.At(qq=target())]) for _ in range(n)],
+            False,
+        ),
+        "fuzzy": (
+            [
+                FakeEvent([Comp.Plain(f"来{single_kw}一下 "), Comp.At(qq=target())])
+                for _ in range(n)
+            ],
+            True,
+        ),
+        "multi_at": (
+            [
+                FakeEvent(
+                    [Comp.Plain(f"{multi_kw} ")] + [Comp.At(qq=target()) for _ in range(3)]
+                )
+                for _ in range(n)
+            ],
+            False,
+        ),
+        "reply_image": (
+            [
+                FakeEvent(
+                    [
+                        Comp.Reply(
+                            id="1",
+                            chain=[Comp.Image(file="photo.jpg", url=image_url)],
+                        ),
+                        Comp.Plain(single_kw),
+                    ]
+                )
+                for _ in range(n)
+            ],
+            False,
+        ),
+    }
+    return scenarios
+
+
+def add_gif_scenario(scenarios, sweep: dict[str, Any], plugin, args):
+    """从合成结果中挑选输出为 GIF 的表情"""
+    rng = random.Random(1)
+    gif_keywords = []
+    for key, result in sweep.items():
+        info = plugin.registry.info(key)
+        if result.get("format") == "GIF" and info and info.keywords:
+            if info.params.min_texts == 0 and info.params.min_images <= 1:
+                gif_keywords.append(info.keywords[0])
+    if gif_keywords:
+        scenarios["gif"] = (
+            [
+                FakeEvent(
+                    [
+                        Comp.Plain(f"{rng.choice(gif_keywords[:5])} "),
+                        Comp.At(qq=str(rng.randrange(100000, 100000 + args.targets))),
+                    ]
+                )
+                for _ in range(args.messages)
+            ],
+            False,
+        )
+
+
+async def run(args) -> dict[str, Any]:
+    server = FakeServer()
+    await server.start()
+    config = FakeConfig(
+        is_check_resources=False,
+        render_mode=args.render_mode,
+        render_workers=args.workers,
+        render_queue_size=10**6,
+        # 基准测试测量吞吐，关闭限流与排队丢弃
+        rate_limit_user_per_min=0,
+        rate_limit_group_per_min=0,
+        schedule_queue_size=0,
+        schedule_max_wait=0,
+        render_cache_memory_mb=64 if args.with_cache else 0,
+        avatar_cache_disk=False,
+    )
+    plugin = main.MemePlugin(types.SimpleNamespace(), config)  # type: ignore
+    plugin.avatar_url = server.url("/headimg_dl?dst_uin={user_id}&spec=640")
+
+    report: dict[str, Any] = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "memes": len(plugin.registry),
+            "keywords": len(plugin.registry.keywords),
+        },
+        "scenarios": {},
+    }
+    try:
+        sweep = {} if args.skip_registry else await registry_sweep(plugin)
+        scenarios = build_events(plugin, server, args)
+        add_gif_scenario(scenarios, sweep, plugin, args)
+        for name, (events, fuzzy) in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            plugin.fuzzy_match = fuzzy
+            concurrency = 1 if name.startswith("chatter") else args.concurrency
+            result = await run_scenario(plugin, events, concurrency)
+            report["scenarios"][name] = result
+            print(
+                f"{name:>14}: {result['messages_per_sec']} msg/s, "
+                f"p50 {result['latency_ms'].get('p50')} ms, "
+                f"p99 {result['latency_ms'].get('p99')} ms"
+            )
+        report["registry"] = sweep
+        report["http_requests"] = server.requests
+        report["plugin_stats"] = plugin.stats.report()
+        report["peak_rss_mb"] = peak_rss_mb(plugin)
+    finally:
+        await plugin.terminate()
+        await server.stop()
+    return report
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(old_path: Path, new_path: Path):
+    """对比两次运行结果"""
+    old = json.loads(old_path.read_text(encoding="utf-8"))
+    new = json.loads(new_path.read_text(encoding="utf-8"))
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for name, result in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if not before:
+            continue
+        for metric, a, b in (
+            ("msg/s", before["messages_per_sec"], result["messages_per_sec"]),
+            ("p50", before["latency_ms"].get("p50"), result["latency_ms"].get("p50")),
+            ("p99", before["latency_ms"].get("p99"), result["latency_ms"].get("p99")),
+        ):
+            if a and b:
+                print(f"{name:>14} {metric:>6}: {a} -> {b} ({(b - a) / a * 100:+.1f}%)")
+    slower = [
+        (key, old["registry"][key]["ms"], r["ms"])
+        for key, r in new.get("registry", {}).items()
+        if "ms" in r and "ms" in old.get("registry", {}).get(key, {})
+    ]
+    slower.sort(key=lambda x: x[2] / x[1] if x[1] else 0, reverse=True)
+    for key, a, b in slower[:10]:
+        print(f"{key:>24}: {a} -> {b} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50, help="每个触发场景的消息数")
+    parser.add_argument("--targets", type=int, default=20, help="被 @ 用户的数量")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时处理的消息数")
+    parser.add_argument("--render-mode", choices=["process", "thread"], default="process")
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--with-cache", action="store_true", help="启用合成结果缓存")
+    parser.add_argument("--skip-registry", action="store_true", help="跳过全部表情的合成耗时测试")
+    parser.add_argument("--only", nargs="*", help="只运行指定场景")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    output = args.output or ROOT / "bench" / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report["meta"]["args"] = {k: str(v) for k, v in vars(args).items()}
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已保存到 {output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+try:
+    from astrbot.core.utils.astrbot_path import get_astrbot_data_path
+
+    DATA_DIR = Path(get_astrbot_data_path()) / "plugin_data" / "astrbot_plugin_memelite"
+except ImportError:
+    DATA_DIR = Path("data") / "plugin_data" / "astrbot_plugin_memelite"
+
+# 以下划线开头，避免被当作 meme_dirs 中的表情包目录加载
+CACHE_DIR = DATA_DIR / "_cache"
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ByteLRU(Generic[K, V]):
+    """按字节数限制容量的 LRU 缓存"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict[K, tuple[V, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        self._data.move_to_end(key)
+        return item[0]
+
+    def put(self, key: K, value: V, size: int):
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self._data[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.size -= evicted
+
+    def pop(self, key: K) -> V | None:
+        item = self._data.pop(key, None)
+        if item is None:
+            return None
+        self.size -= item[1]
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+
+class Singleflight(Generic[K, V]):
+    """合并同一个键上并发的请求，只执行一次"""
+
+    def __init__(self):
+        self._inflight: dict[K, asyncio.Future] = {}
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(func())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+class BlobStore:
+    """内容寻址的磁盘缓存：数据按 sha256 存放，键通过引用文件指向数据"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.blobs = root / "blobs"
+        self.refs = root / "refs"
+
+    @staticmethod
+    def _safe(key: str) -> str:
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blobs / digest[:2] / digest
+
+    def ref_path(self, key: str) -> Path:
+        return self.refs / self._safe(key)
+
+    def read(self, key: str) -> tuple[bytes, float] | None:
+        """读取键对应的数据与写入时间"""
+        ref = self.ref_path(key)
+        try:
+            digest = ref.read_text().strip()
+            mtime = ref.stat().st_mtime
+            return self._blob_path(digest).read_bytes(), mtime
+        except (OSError, ValueError):
+            return None
+
+    def blob_path(self, key: str) -> Path | None:
+        """键对应的数据文件路径"""
+        try:
+            digest = self.ref_path(key).read_text().strip()
+        except OSError:
+            return None
+        path = self._blob_path(digest)
+        return path if path.is_file() else None
+
+    def write(self, key: str, data: bytes) -> Path:
+        """写入数据，相同内容只保存一份"""
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self._blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(blob)
+        self.refs.mkdir(parents=True, exist_ok=True)
+        ref = self.ref_path(key)
+        tmp = ref.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(digest)
+        tmp.replace(ref)
+        return blob
+
+    def remove(self, key: str):
+        self.ref_path(key).unlink(missing_ok=True)
+
+    def prune(self, max_age: float) -> int:
+        """删除过期的引用与不再被引用的数据，返回删除的数据文件数"""
+        now = time.time()
+        alive: set[str] = set()
+        if self.refs.is_dir():
+            for ref in self.refs.iterdir():
+                try:
+                    if now - ref.stat().st_mtime > max_age:
+                        ref.unlink()
+                    else:
+                        alive.add(ref.read_text().strip())
+                except OSError:
+                    continue
+        removed = 0
+        if self.blobs.is_dir():
+            for blob in self.blobs.glob("*/*"):
+                if blob.name not in alive:
+                    blob.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+
+def run_background(coro: Awaitable[Any]) -> asyncio.Task:
+    """在后台执行协程，并保留任务引用防止被回收"""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+_background_tasks: set[asyncio.Future] = set()
@@ -0,0 +1,210 @@
+import io
+from dataclasses import dataclass
+from typing import Literal
+
+from PIL import Image, ImageSequence
+
+# 复用调色板时预留给透明色的索引
+TRANSPARENT_INDEX = 255
+
+
+@dataclass
+class CompressOptions:
+    """图片压缩参数"""
+
+    max_size: int = 512
+    # 静态图输出格式，original 表示保持原格式
+    static_format: Literal["original", "png", "png_quantized", "jpeg", "webp"] = "original"
+    # JPEG / WebP 质量
+    static_quality: int = 85
+    # 静态图目标大小 (字节)，超过时降低质量或缩小尺寸，0 表示不限制
+    static_target_bytes: int = 0
+    # GIF 压缩
+    gif: bool = True
+    # 每帧最短时长 (毫秒)，短于此的帧会与后续帧合并，0 表示不抽帧
+    gif_min_frame_ms: int = 0
+    # 所有帧复用首帧的调色板，编码更快、体积更小
+    gif_reuse_palette: bool = True
+    # 目标大小 (字节)，超过时进一步缩小尺寸、降低帧率，0 表示不限制
+    gif_target_bytes: int = 0
+
+
+def compress_image(
+    image_io: io.BytesIO, options: CompressOptions | None = None
+) -> io.BytesIO | None:
+    """压缩静态图片或 GIF 到 max_size 大小，无需压缩时返回 None"""
+    options = options or CompressOptions()
+    try:
+        # 将输入的 bytes 加载为图片
+        img = Image.open(image_io)
+
+        if img.format == "GIF":
+            if not options.gif:
+                return
+            return compress_gif(img, options)
+
+        return compress_static(img, options)
+
+    except Exception as e:
+        raise ValueError(f"图片压缩失败: {e}")
+
+
+def compress_static(img: Image.Image, options: CompressOptions) -> io.BytesIO:
+    """缩小静态图片并按指定格式编码"""
+    fmt = options.static_format
+    # 保持原格式时不做额外的编码优化，PNG 的 optimize 耗时翻倍而体积几乎不变
+    optimize = fmt != "original"
+    if not optimize:
+        fmt = (img.format or "png").lower()
+    img = _downscale(img, options.max_size)
+
+    quality = options.static_quality
+    target = options.static_target_bytes
+    output = _encode_static(img, fmt, quality, optimize)
+    # 目标大小模式：有损格式先降低质量，其余格式缩小尺寸，最多重试四次
+    for _ in range(4):
+        if not target or output.getbuffer().nbytes <= target:
+            break
+        if fmt in ("jpeg", "webp") and quality > 40:
+            quality -= 15
+        else:
+            img = _downscale(img, max(int(max(img.size) * 0.75), 64))
+        output = _encode_static(img, fmt, quality, optimize)
+    return output
+
+
+def _downscale(img: Image.Image, max_size: int) -> Image.Image:
+    """先用 draft (仅 JPEG) 与整数倍 reduce 快速缩小，再做最终重采样"""
+    if img.width <= max_size and img.height <= max_size:
+        return img
+    img.draft(img.mode, (max_size, max_size))
+    img = img.copy()
+    img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+def _encode_static(
+    img: Image.Image, fmt: str, quality: int, optimize: bool = True
+) -> io.BytesIO:
+    output = io.BytesIO()
+    if fmt == "jpeg":
+        _flatten(img).save(output, format="JPEG", quality=quality, optimize=optimize)
+    elif fmt == "webp":
+        img.save(output, format="WEBP", quality=quality, method=4)
+    elif fmt == "png_quantized":
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        img.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(
+            output, format="PNG", optimize=True
+        )
+    elif fmt == "png":
+        img.save(output, format="PNG", optimize=optimize)
+    else:
+        img.save(output, format=fmt.upper())
+    return output
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """JPEG 不支持透明，透明部分以白色填充"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def compress_gif(img: Image.Image, options: CompressOptions) -> io.BytesIO | None:
+    """逐帧缩小 GIF，可选抽帧、复用调色板与目标大小"""
+    max_size = options.max_size
+    min_frame_ms = options.gif_min_frame_ms
+    target = options.gif_target_bytes
+    if (
+        max(img.size) <= max_size
+        and not min_frame_ms
+        and not (target and _size_of(img) > target)
+    ):
+        return
+
+    output = _encode_gif(img, max_size, min_frame_ms, options.gif_reuse_palette)
+    # 目标大小模式：逐步缩小尺寸并降低帧率，最多重试三次
+    for _ in range(3):
+        if not target or output.getbuffer().nbytes <= target:
+            break
+        max_size = max(int(max_size * 0.75), 64)
+        min_frame_ms = max(min_frame_ms, 40) * 3 // 2
+        output = _encode_gif(img, max_size, min_frame_ms, options.gif_reuse_palette)
+    # 重新编码后反而更大时发送原图
+    original_size = _size_of(img)
+    if original_size and output.getbuffer().nbytes >= original_size:
+        return
+    return output
+
+
+def _size_of(img: Image.Image) -> int:
+    fp = getattr(img, "fp", None)
+    if isinstance(fp, io.BytesIO):
+        return fp.getbuffer().nbytes
+    return 0
+
+
+def _encode_gif(
+    img: Image.Image, max_size: int, min_frame_ms: int, reuse_palette: bool
+) -> io.BytesIO:
+    """逐帧解码、缩放与量化，任意时刻只保留一帧原尺寸图像"""
+    ratio = min(1.0, max_size / max(img.size))
+    size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+    default_duration = img.info.get("duration", 100)
+
+    frames: list[Image.Image] = []
+    durations: list[int] = []
+    palette: Image.Image | None = None
+    has_alpha = False
+    for frame in ImageSequence.Iterator(img):
+        duration = frame.info.get("duration", default_duration) or default_duration
+        # 抽帧：上一帧时长不足时，将当前帧并入上一帧
+        if frames and min_frame_ms and durations[-1] < min_frame_ms:
+            durations[-1] += duration
+            continue
+
+        rgba = frame.convert("RGBA")
+        if rgba.size != size:
+            rgba = rgba.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        if reuse_palette:
+            rgb = rgba.convert("RGB")
+            if palette is None:
+                palette = rgb.quantize(
+                    colors=TRANSPARENT_INDEX, method=Image.Quantize.FASTOCTREE
+                )
+            out = rgb.quantize(palette=palette, dither=Image.Dither.NONE)
+            alpha = rgba.getchannel("A")
+            if alpha.getextrema()[0] < 128:
+                has_alpha = True
+                out.paste(TRANSPARENT_INDEX, mask=alpha.point(lambda a: 255 if a < 128 else 0))
+        else:
+            has_alpha = has_alpha or rgba.getchannel("A").getextrema()[0] < 128
+            out = rgba
+
+        frames.append(out)
+        durations.append(duration)
+
+    output = io.BytesIO()
+    save_kwargs = {}
+    # 只有含透明像素时才需要透明色与"恢复背景"的处置方式；
+    # 否则交给 Pillow 只写入与上一帧不同的区域，体积小得多
+    if has_alpha:
+        save_kwargs["disposal"] = 2
+        if reuse_palette:
+            save_kwargs["transparency"] = TRANSPARENT_INDEX
+    frames[0].save(
+        output,
+        format="GIF",
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=img.info.get("loop", 0),
+        optimize=False,
+        **save_kwargs,
+    )
+    return output
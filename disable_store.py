@@ -0,0 +1,136 @@
+import asyncio
+from typing import Literal
+
+from astrbot import logger
+from astrbot.core import AstrBotConfig
+
+Scope = Literal["global", "group", "user"]
+
+
+class DisableStore:
+    """表情禁用列表
+
+    - global：全局禁用，对应配置 memes_disabled_list
+    - group / user：只在某个群、或对某个用户禁用，对应配置 memes_disabled_scoped，
+      每项形如 "group:<群号>:<关键词>"
+    - 修改后延迟合并写入配置文件，写入在线程中进行，不阻塞事件循环
+    """
+
+    def __init__(self, config: AstrBotConfig, save_delay: float = 2.0):
+        self.config = config
+        self.save_delay = save_delay
+        # 用 dict 作为有序集合，保留禁用顺序
+        self._global: dict[str, None] = dict.fromkeys(
+            config.get("memes_disabled_list", [])
+        )
+        self._scoped: dict[tuple[str, str, str], None] = {}
+        for item in config.get("memes_disabled_scoped", []):
+            parts = str(item).split(":", 2)
+            if len(parts) == 3 and parts[0] in ("group", "user"):
+                self._scoped[(parts[0], parts[1], parts[2])] = None
+        self._save_task: asyncio.Task | None = None
+        # 修改计数与已写入的计数，不相等表示有尚未保存的修改
+        self._version = 0
+        self._saved_version = 0
+        self._saving = False
+
+    @property
+    def global_keywords(self) -> list[str]:
+        return list(self._global)
+
+    def scoped_keywords(self, scope: Scope, scope_id: str) -> list[str]:
+        return [k for s, i, k in self._scoped if s == scope and i == scope_id]
+
+    def is_disabled(self, keyword: str, group_id: str = "", user_id: str = "") -> bool:
+        """关键词在当前群、当前用户或全局是否被禁用"""
+        return (
+            keyword in self._global
+            or (bool(group_id) and ("group", group_id, keyword) in self._scoped)
+            or (bool(user_id) and ("user", user_id, keyword) in self._scoped)
+        )
+
+    def _contains(self, keyword: str, scope: Scope, scope_id: str) -> bool:
+        if scope == "global":
+            return keyword in self._global
+        return (scope, scope_id, keyword) in self._scoped
+
+    def disable(self, keywords: list[str], scope: Scope = "global", scope_id: str = ""):
+        """禁用关键词，返回 (新禁用的, 原本已禁用的)"""
+        changed, unchanged = [], []
+        for keyword in keywords:
+            if self._contains(keyword, scope, scope_id):
+                unchanged.append(keyword)
+                continue
+            if scope == "global":
+                self._global[keyword] = None
+            else:
+                self._scoped[(scope, scope_id, keyword)] = None
+            changed.append(keyword)
+        if changed:
+            self._schedule_save()
+        return changed, unchanged
+
+    def enable(self, keywords: list[str], scope: Scope = "global", scope_id: str = ""):
+        """启用关键词，返回 (新启用的, 原本未禁用的)"""
+        changed, unchanged = [], []
+        for keyword in keywords:
+            if not self._contains(keyword, scope, scope_id):
+                unchanged.append(keyword)
+                continue
+            if scope == "global":
+                del self._global[keyword]
+            else:
+                del self._scoped[(scope, scope_id, keyword)]
+            changed.append(keyword)
+        if changed:
+            self._schedule_save()
+        return changed, unchanged
+
+    def _sync_config(self):
+        # 整体替换列表对象，避免写入线程遍历时列表被修改
+        self.config["memes_disabled_list"] = list(self._global)
+        self.config["memes_disabled_scoped"] = [
+            f"{scope}:{scope_id}:{keyword}" for scope, scope_id, keyword in self._scoped
+        ]
+
+    @property
+    def dirty(self) -> bool:
+        return self._version != self._saved_version
+
+    def _schedule_save(self):
+        self._sync_config()
+        self._version += 1
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.ensure_future(self._delayed_save())
+
+    async def _delayed_save(self):
+        await asyncio.sleep(self.save_delay)
+        # 写入期间又有修改时继续写入，直到没有未保存的修改或写入失败
+        while self.dirty and await self._save():
+            pass
+
+    async def _save(self) -> bool:
+        version = self._version
+        self._saving = True
+        try:
+            await asyncio.to_thread(self.config.save_config, replace_config=self.config)
+        except Exception as e:
+            logger.error(f"保存禁用列表失败: {e}")
+            return False
+        finally:
+            self._saving = False
+        self._saved_version = version
+        return True
+
+    async def flush(self):
+        """立即写入尚未保存的修改"""
+        task = self._save_task
+        if task and not task.done():
+            if self._saving:
+                # 正在写入时不能取消，等它写完 (包括写入期间的新修改)
+                await task
+            else:
+                task.cancel()
+                self._save_task = None
+        if self.dirty:
+            await self._save()
@@ -0,0 +1,56 @@
+import asyncio
+
+import aiohttp
+
+
+class HttpClient:
+    """插件生命周期内共享的 HTTP 客户端，带连接池、keep-alive 与 DNS 缓存"""
+
+    def __init__(
+        self,
+        total_timeout: float = 10,
+        connect_timeout: float = 5,
+        limit: int = 32,
+        limit_per_host: int = 8,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30,
+    ):
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout, connect=connect_timeout
+        )
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: aiohttp.ClientSession | None = None
+        self._lock = asyncio.Lock()
+
+    async def session(self) -> aiohttp.ClientSession:
+        """获取共享会话，首次使用时在事件循环内创建"""
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=self.limit,
+                        limit_per_host=self.limit_per_host,
+                        ttl_dns_cache=self.dns_cache_ttl,
+                        keepalive_timeout=self.keepalive_timeout,
+                    )
+                    self._session = aiohttp.ClientSession(
+                        connector=connector, timeout=self.timeout
+                    )
+        return self._session
+
+    async def get_bytes(self, url: str, raise_for_status: bool = True) -> bytes:
+        """GET 请求并读取全部响应内容"""
+        session = await self.session()
+        async with session.get(url) as response:
+            if raise_for_status:
+                response.raise_for_status()
+            return await response.read()
+
+    async def close(self):
+        """关闭会话与连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import binascii
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from .compress import CompressOptions, compress_gif, compress_static
+from .http_client import HttpClient
+
+# 常见图片格式的文件头
+_MAGIC: tuple[tuple[bytes, str], ...] = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+
+
+# 判断格式所需的文件头长度 (WebP 需要 12 字节)
+_SNIFF_BYTES = 16
+
+
+class IngestError(Exception):
+    """输入图片不可用 (过大、不是图片等)"""
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """根据文件头判断图片格式"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+class ImageIngestor:
+    """输入图片读取
+
+    - 本地文件在线程中读取
+    - 网络图片流式下载，超过大小上限立即中止
+    - 按文件头校验是否为图片，尺寸过大的图片在进入合成前先缩小
+    """
+
+    def __init__(
+        self,
+        http: HttpClient,
+        max_bytes: int = 10 * 1024 * 1024,
+        max_pixels: int = 40_000_000,
+        max_side: int = 1024,
+    ):
+        self.http = http
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_side = max_side
+
+    def _check_size(self, size: int):
+        if size > self.max_bytes:
+            raise IngestError(
+                f"图片大小 {size / 1024 / 1024:.1f} MB 超过上限 "
+                f"{self.max_bytes / 1024 / 1024:.1f} MB"
+            )
+
+    async def read_file(self, path: str | Path) -> bytes:
+        """读取本地图片"""
+
+        def _read() -> bytes:
+            self._check_size(Path(path).stat().st_size)
+            return Path(path).read_bytes()
+
+        return await asyncio.to_thread(_read)
+
+    async def download(self, url: str) -> bytes:
+        """流式下载网络图片"""
+        session = await self.http.session()
+        async with session.get(url) as response:
+            if response.content_length is not None:
+                self._check_size(response.content_length)
+            buffer = bytearray()
+            sniffed = False
+
+            def _check_type():
+                if not sniff_image_type(bytes(buffer[:_SNIFF_BYTES])):
+                    raise IngestError(
+                        f"链接内容不是图片 ({response.headers.get('Content-Type', '未知类型')})"
+                    )
+
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                buffer += chunk
+                self._check_size(len(buffer))
+                # 首个分块可能很短，攒够文件头再判断格式
+                if not sniffed and len(buffer) >= _SNIFF_BYTES:
+                    _check_type()
+                    sniffed = True
+            if not sniffed:
+                _check_type()
+            return bytes(buffer)
+
+    async def decode_base64(self, data: str) -> bytes:
+        """解码 Base64 图片，较大时在线程中解码"""
+        if data.startswith("base64://"):
+            data = data[len("base64://") :]
+        self._check_size(len(data) * 3 // 4)
+        try:
+            if len(data) > 1024 * 1024:
+                return await asyncio.to_thread(base64.b64decode, data)
+            return base64.b64decode(data)
+        except (binascii.Error, ValueError) as e:
+            raise IngestError(f"Base64 图片解码失败: {e}") from None
+
+    async def normalize(self, data: bytes) -> bytes:
+        """校验图片并缩小过大的图片"""
+        if not sniff_image_type(data[:_SNIFF_BYTES]):
+            raise IngestError("不支持的图片格式")
+        return await asyncio.to_thread(self._normalize, data)
+
+    def _normalize(self, data: bytes) -> bytes:
+        # 只读取文件头中的尺寸，不解码像素
+        img = Image.open(io.BytesIO(data))
+        width, height = img.size
+        if width * height > self.max_pixels:
+            raise IngestError(f"图片尺寸 {width}x{height} 过大")
+        if max(width, height) <= self.max_side:
+            return data
+        options = CompressOptions(max_size=self.max_side, gif_reuse_palette=False)
+        if img.format == "GIF":
+            output = compress_gif(img, options)
+        else:
+            output = compress_static(img, options)
+        return output.getvalue() if output else data
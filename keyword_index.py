@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Iterable
+
+
+class KeywordIndex:
+    """表情关键词索引
+
+    - 精确匹配：以消息第一个单词查哈希表
+    - 模糊匹配：Aho-Corasick 自动机，一次扫描消息，返回最靠左、最长的关键词
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._exact: dict[str, str] = {}
+        # 自动机节点：转移表、失配指针、节点自身对应的关键词、输出链（最近的终止后缀节点）
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._word: list[str | None] = [None]
+        self._out: list[int] = [0]
+        self._max_len = 0
+
+        for keyword in keywords:
+            if not keyword or keyword in self._exact:
+                continue
+            self._exact[keyword] = keyword
+            self._insert(keyword)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def __contains__(self, keyword: object) -> bool:
+        return keyword in self._exact
+
+    def _insert(self, keyword: str):
+        node = 0
+        for char in keyword:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._word.append(None)
+                self._out.append(0)
+            node = nxt
+        self._word[node] = keyword
+        self._max_len = max(self._max_len, len(keyword))
+
+    def _build(self):
+        """广度优先计算失配指针与输出链"""
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                suffix = self._fail[child]
+                self._out[child] = suffix if self._word[suffix] else self._out[suffix]
+                queue.append(child)
+
+    def match_exact(self, message: str) -> str | None:
+        """精确匹配：消息的第一个单词等于关键词"""
+        words = message.split(maxsplit=1)
+        if not words:
+            return None
+        return self._exact.get(words[0])
+
+    def match_fuzzy(self, message: str) -> str | None:
+        """模糊匹配：消息中包含关键词，返回最靠左的最长关键词"""
+        best: str | None = None
+        best_start = len(message)
+        node = 0
+        for i, char in enumerate(message):
+            # 之后结束的关键词不可能比当前结果更靠左
+            if best is not None and i - self._max_len + 1 > best_start:
+                break
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+
+            hit = node if self._word[node] else self._out[node]
+            while hit:
+                word = self._word[hit]
+                assert word is not None
+                start = i - len(word) + 1
+                if start < best_start or (
+                    start == best_start and best is not None and len(word) > len(best)
+                ):
+                    best, best_start = word, start
+                hit = self._out[hit]
+        return best
+
+    def match(self, message: str, fuzzy: bool = False) -> str | None:
+        """根据匹配模式查找消息中的关键词"""
+        return self.match_fuzzy(message) if fuzzy else self.match_exact(message)
@@ -1,12 +1,8 @@
 import asyncio
-import base64
+from dataclasses import asdict, dataclass
 from pathlib import Path
 import random
-import aiohttp
-from meme_generator import Meme, get_memes
-from meme_generator.download import check_resources
-from meme_generator.exception import MemeGeneratorException
-from meme_generator.utils import run_sync, render_meme_list
+import time
 
 from astrbot import logger
 from astrbot.api.event import filter, AstrMessageEvent
@@ -14,21 +10,57 @@ from astrbot.api.star import Context, Star, register
 from astrbot.core import AstrBotConfig
 
 import io
-from typing import Any, List, Literal, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Awaitable, List
 import astrbot.core.message.components as Comp
 from astrbot.core.star.filter.event_message_type import EventMessageType
-from PIL import Image
-from dataclasses import dataclass, field
-from .args_dict import args_dict
+from .args_schema import ArgError, ArgSchema
+from .avatar_cache import AvatarCache
+from .cache import CACHE_DIR, run_background
+from .compress import CompressOptions, compress_image
+from .disable_store import DisableStore
+from .http_client import HttpClient
+from .ingest import ImageIngestor, IngestError
+from .output_spool import OutputSpool
+from .preview_cache import PreviewCache
+from .prerender import Prerenderer
+from .registry import MemeParams, MemeRegistry
+from .resources import check_resources_incremental
+from .render_engine import RenderBusy, RenderEngine, RenderError
+from .result_cache import RenderCache, make_render_key
+from .scheduler import AdmissionRejected, FairScheduler, JobExpired
+from .stats import Stats
+from .user_info import UserInfoCache
+
+if TYPE_CHECKING:
+    from meme_generator import Meme
+
+MANIFEST_PATH = CACHE_DIR / "manifest.json"
+RESOURCE_STATE_PATH = CACHE_DIR / "resources.json"
+
+
+def _is_local_file(path: str) -> bool:
+    """是否为本地文件路径 (过长的字符串如 Base64 数据直接排除)"""
+    if len(path) > 1024 or path.startswith(("base64://", "http://", "https://")):
+        return False
+    try:
+        return Path(path).is_file()
+    except (OSError, ValueError):
+        return False
 
 
 @dataclass
-class MemeProperties:
-    disabled: bool = False
-    labels: list[Literal["new", "hot"]] = field(default_factory=list)
+class _Inputs:
+    """从一条消息中收集到的、与具体表情无关的参数"""
 
-
-# TODO 禁用 meme、new 标签、hot 标签
+    images: list[bytes]
+    texts: list[str]
+    options: dict[str, Any]
+    # 被 @ 用户的昵称，没有 @ 时为发送者昵称
+    target_names: list[str]
+    # 已获取的发送者与 bot 头像，供补齐图片时复用
+    fallback_avatars: dict[str, bytes | None]
+    # 每张图片对应的头像所属用户，非头像图片为 None
+    image_owners: list[str | None]
 
 
 @register(
@@ -39,25 +71,177 @@ class MemeProperties:
     "https://github.com/Omnisch/astrbot_plugin_memelite",
 )
 class MemePlugin(Star):
+    # 头像下载地址，基准测试中会替换为本地服务
+    avatar_url: str = "https://q4.qlogo.cn/headimg_dl?dst_uin={user_id}&spec=640"
+
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
+        init_start = time.perf_counter()
         self.config = config
-        self.memes_disabled_list: list[str] = config.get("memes_disabled_list", [])
+        self.stats = Stats()
+        self.disabled = DisableStore(config)
 
-        self.memes: list[Meme] = get_memes()
-        self.meme_keywords: list = [
-            keyword for meme in self.memes for keyword in meme.keywords
-        ]
+        # 快速启动：由清单构建关键词索引，首次使用时才加载表情
+        registry = None
+        if config.get("lazy_startup", False):
+            registry = MemeRegistry.from_manifest(MANIFEST_PATH)
+        if registry is None:
+            from meme_generator import get_memes
+
+            registry = MemeRegistry.from_memes(get_memes(), MANIFEST_PATH)
+            run_background(registry.save_manifest_async())
+        self.registry = registry
 
         self.prefix: str = config.get("prefix", "")
+        self.sort_by: str = config.get("sort_by_str", "key")
 
         self.fuzzy_match: bool = config.get("fuzzy_match", False)
         self.is_compress_image: bool = config.get("is_compress_image", True)
+        self.compress_options = CompressOptions(
+            max_size=config.get("compress_max_size", 512),
+            static_format=config.get("static_format", "original"),
+            static_quality=config.get("static_quality", 85),
+            static_target_bytes=int(config.get("static_target_kb", 0) * 1024),
+            gif=config.get("is_compress_gif", True),
+            gif_min_frame_ms=config.get("gif_min_frame_ms", 0),
+            gif_reuse_palette=config.get("gif_reuse_palette", True),
+            gif_target_bytes=int(config.get("gif_target_kb", 0) * 1024),
+        )
+
+        self.http = HttpClient(
+            total_timeout=config.get("http_timeout", 10),
+            connect_timeout=config.get("http_connect_timeout", 5),
+            limit=config.get("http_max_connections", 32),
+            limit_per_host=config.get("http_max_connections_per_host", 8),
+        )
+        self.avatar_cache = AvatarCache(
+            fetch=self._download_avatar,
+            cache_dir=(
+                CACHE_DIR / "avatars" if config.get("avatar_cache_disk", True) else None
+            ),
+            ttl=config.get("avatar_cache_ttl", 6 * 3600),
+            stale_ttl=config.get("avatar_cache_stale_ttl", 7 * 24 * 3600),
+            max_memory_bytes=int(config.get("avatar_cache_memory_mb", 32) * 1024 * 1024),
+        )
+        run_background(self.avatar_cache.prune())
+        self.ingestor = ImageIngestor(
+            self.http,
+            max_bytes=int(config.get("input_max_mb", 10) * 1024 * 1024),
+            max_pixels=int(config.get("input_max_megapixels", 40) * 1_000_000),
+            max_side=config.get("input_max_side", 1024),
+        )
+        self.fetch_concurrency: int = max(config.get("fetch_concurrency", 8), 1)
+        self.batch_max_memes: int = max(config.get("batch_max_memes", 6), 1)
+        self.batch_max_bytes = int(config.get("batch_max_output_mb", 10) * 1024 * 1024)
+
+        self.render_engine = RenderEngine(
+            mode=config.get("render_mode", "process"),
+            workers=config.get("render_workers", 0),
+            queue_size=config.get("render_queue_size", 16),
+            timeout=config.get("render_timeout", 60),
+        )
+        self.scheduler = FairScheduler(
+            concurrency=config.get("render_concurrency", 0) or self.render_engine.workers,
+            user_rate_per_min=config.get("rate_limit_user_per_min", 0),
+            group_rate_per_min=config.get("rate_limit_group_per_min", 0),
+            max_queue=config.get("schedule_queue_size", 64),
+            max_wait=config.get("schedule_max_wait", 30),
+        )
+        self.render_cache = RenderCache(
+            max_memory_bytes=int(config.get("render_cache_memory_mb", 64) * 1024 * 1024),
+            cache_dir=(
+                CACHE_DIR / "renders" if config.get("render_cache_disk", False) else None
+            ),
+            disk_ttl=config.get("render_cache_disk_ttl", 7 * 24 * 3600),
+        )
+        run_background(self.render_cache.prune())
+        # file 模式：以文件路径发送结果图片，而不是在内存中编码为 Base64
+        self.output_spool = (
+            OutputSpool(CACHE_DIR / "output", ttl=config.get("output_file_ttl", 600))
+            if config.get("output_mode", "bytes") == "file"
+            else None
+        )
+
+        self.prerenderer: Prerenderer | None = None
+        self._prerender_task = None
+        if config.get("prerender", False):
+            self.prerenderer = Prerenderer(
+                render=self._prerender,
+                eligible=self._prerender_eligible,
+                busy=lambda: bool(
+                    self.scheduler.depth or self.scheduler.running or self.render_engine.pending
+                ),
+                max_pairs=config.get("prerender_max_pairs", 20),
+                idle_seconds=config.get("prerender_idle_seconds", 60),
+                cpu_seconds_per_hour=config.get("prerender_cpu_seconds_per_hour", 120),
+                max_bytes=int(config.get("prerender_max_mb", 32) * 1024 * 1024),
+            )
+            self._prerender_task = run_background(self.prerenderer.run())
+
+        self.stats_path: str = config.get("stats_prometheus_path", "")
+        self._stats_task = (
+            run_background(self._dump_stats_loop(config.get("stats_dump_interval", 60)))
+            if self.stats_path
+            else None
+        )
+
+        self.preview_cache = PreviewCache(CACHE_DIR / "previews")
+        run_background(self.preview_cache.prune())
+        if config.get("preview_prewarm", False):
+            run_background(self._prewarm_previews())
+        self.user_info_cache = UserInfoCache(
+            fetch=self._fetch_extra,
+            ttl=config.get("user_info_cache_ttl", 3600),
+            negative_ttl=config.get("user_info_negative_ttl", 300),
+        )
 
         self.is_check_resources: bool = config.get("is_check_resources", True)
         if self.is_check_resources:
-            logger.info("正在检查 memes 资源文件...")
-            asyncio.create_task(check_resources())
+            run_background(
+                check_resources_incremental(
+                    RESOURCE_STATE_PATH,
+                    config.get("resource_check_interval", 168) * 3600,
+                )
+            )
+
+        logger.info(
+            f"表情包插件初始化完成，共 {len(self.registry)} 个表情，"
+            f"{'由清单快速启动' if not self.registry.loaded else '已加载全部表情'}，"
+            f"耗时 {(time.perf_counter() - init_start) * 1000:.0f} ms"
+        )
+
+    async def terminate(self):
+        """插件卸载时释放资源"""
+        await self.disabled.flush()
+        await self.http.close()
+        if self._prerender_task:
+            self._prerender_task.cancel()
+        self.render_engine.shutdown()
+        if self._stats_task:
+            self._stats_task.cancel()
+            self._dump_stats()
+
+    async def _prewarm_previews(self):
+        memes = await self.registry.load()
+        await self.preview_cache.warm(memes, self.disabled.global_keywords, self.sort_by)
+
+    def _update_gauges(self):
+        self.stats.set_gauge("queue_depth", self.scheduler.depth)
+        self.stats.set_gauge("render_running", self.scheduler.running)
+        self.stats.set_gauge("render_pending", self.render_engine.pending)
+
+    def _dump_stats(self):
+        self._update_gauges()
+        try:
+            self.stats.dump_prometheus(Path(self.stats_path))
+        except OSError as e:
+            logger.warning(f"写入统计文件失败: {e}")
+
+    async def _dump_stats_loop(self, interval: float):
+        """定期将统计数据写入 Prometheus 文本文件"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self._dump_stats)
 
     @filter.command_group("meme")
     def meme(self):
@@ -67,16 +251,10 @@ class MemePlugin(Star):
     @meme.command("list")
     async def list(self, event: AstrMessageEvent):
         """查看关键词列表"""
-        meme_list: List[Tuple[Meme, Optional[MemeProperties]]] = [
-            (meme, MemeProperties(labels=[])) for meme in self.memes
-        ]
-        text_template = "{index}.{keywords}"
-        image_io: io.BytesIO = render_meme_list(
-            meme_list=meme_list,  # type: ignore
-            text_template=text_template,
-            add_category_icon=True,
+        image = await self.preview_cache.get_list(
+            await self.registry.load(), self.disabled.global_keywords, self.sort_by
         )
-        yield event.chain_result([Comp.Image.fromBytes(image_io.getvalue())])
+        yield event.chain_result([Comp.Image.fromBytes(image)])
 
     @meme.command("help")
     async def show_details(
@@ -90,32 +268,33 @@ class MemePlugin(Star):
                 "- /meme help <关键词> - 查看指定表情需要的参数\n"
                 "- /meme list - 可用表情列表\n"
                 "- /meme enable <关键词> - 启用表情\n"
-                "- /meme disable <关键词> - 禁用表情\n"
-                "- /meme blacklist - 查看禁用的表情\n\n"
+                "- /meme disable <关键词...> [-g|-u] - 禁用表情，-g 仅本群，-u 仅自己\n"
+                "- /meme blacklist - 查看禁用的表情\n"
+                "- /meme batch <关键词...> [@用户] - 一次生成多个表情\n"
+                "- /meme stats - 查看各阶段耗时统计\n\n"
                 "用空格隔开参数，文本参数需用半角引号 (\") 包围"
             )
             return
         keyword = str(keyword)
-        target_keyword = next((k for k in self.meme_keywords if k == keyword), None)
-        if target_keyword is None:
+        if not self.registry.is_keyword(keyword):
             yield event.plain_result("不支持的表情")
             return
 
         # 匹配 meme
-        meme = self._find_meme(keyword)
+        meme = await self.registry.get(keyword)
         if not meme:
             yield event.plain_result("未找到表情")
             return
 
         # 提取 meme 的所有参数
         name = meme.key
-        params_type = meme.params_type
+        params = self.registry.params(meme)
         keywords = meme.keywords
-        min_images = params_type.min_images
-        max_images = params_type.max_images
-        min_texts = params_type.min_texts
-        max_texts = params_type.max_texts
-        default_texts = params_type.default_texts
+        min_images = params.min_images
+        max_images = params.max_images
+        min_texts = params.min_texts
+        max_texts = params.max_texts
+        default_texts = params.default_texts
         # tags = meme.tags
 
         meme_info = ""
@@ -145,63 +324,205 @@ class MemePlugin(Star):
         # if tags:
         #     meme_info += f"标签: {list(tags)}\n"
 
-        args_type = getattr(params_type, "args_type", None)
-        if args_type:
+        schema = self.registry.schema(meme)
+        if schema:
             meme_info += "其他参数 (使用下划线使用默认):\n"
-            fields = args_type.args_model.__annotations__
-            for field_name in fields.keys():
-                field = args_type.args_model.__fields__[field_name]
-                meme_info += f"- {field.description or '无描述'}"
-                meme_info += f" (默认为 {field.default})\n"
+            for arg in schema.fields:
+                meme_info += f"{arg.describe()}\n"
 
-        preview: bytes = meme.generate_preview().getvalue()  # type: ignore
+        preview: bytes = await self.preview_cache.get_preview(meme)
         chain = [
             Comp.Plain(meme_info),
             Comp.Image.fromBytes(preview),
         ]
         yield event.chain_result(chain)
 
+    @staticmethod
+    def _session(event: AstrMessageEvent) -> str:
+        """调度用的会话：群聊按群，私聊按用户"""
+        group_id = event.get_group_id()
+        return f"group:{group_id}" if group_id else f"user:{event.get_sender_id()}"
+
+    @staticmethod
+    def _command_args(event: AstrMessageEvent, command: str) -> List[str]:
+        """取出子命令之后的全部参数"""
+        tokens = event.get_message_str().split()
+        if command in tokens:
+            return tokens[tokens.index(command) + 1 :]
+        return tokens[1:]
+
+    def _parse_scope(self, event: AstrMessageEvent, args: List[str]):
+        """解析作用范围：-g 本群，-u 自己，默认全局；返回 (scope, scope_id, 其余参数)"""
+        scope, scope_id = "global", ""
+        rest = []
+        for arg in args:
+            if arg == "-g":
+                scope, scope_id = "group", str(event.get_group_id() or "")
+            elif arg == "-u":
+                scope, scope_id = "user", str(event.get_sender_id())
+            else:
+                rest.append(arg)
+        return scope, scope_id, rest
+
+    _SCOPE_NAMES = {"global": "", "group": "本群", "user": "对你"}
+
+    def _toggle(self, event: AstrMessageEvent, command: str, disable: bool):
+        action = "禁用" if disable else "启用"
+        scope, scope_id, names = self._parse_scope(
+            event, self._command_args(event, command)
+        )
+        if not names:
+            return f"未指定要{action}的表情"
+        if scope != "global" and not scope_id:
+            return "当前不在群聊中，无法按群设置"
+        missing = [name for name in names if not self.registry.is_keyword(name)]
+        keywords = [name for name in dict.fromkeys(names) if name not in missing]
+        toggle = self.disabled.disable if disable else self.disabled.enable
+        changed, unchanged = toggle(keywords, scope, scope_id)  # type: ignore
+        where = self._SCOPE_NAMES[scope]
+        lines = []
+        if changed:
+            lines.append(f"已{where}{action}表情: {'、'.join(changed)}")
+            logger.info(f"{scope}:{scope_id} {action}表情: {changed}")
+        if unchanged:
+            state = "已被禁用" if disable else "未被禁用"
+            lines.append(f"表情: {'、'.join(unchanged)}{state}")
+        if missing:
+            lines.append(f"表情: {'、'.join(missing)}不存在")
+        return "\n".join(lines)
+
     @meme.command("disable")
     async def add_supervisor(
         self, event: AstrMessageEvent, meme_name: str | None = None
     ):
-        """禁用表情"""
-        if not meme_name:
-            yield event.plain_result("未指定要禁用的表情")
-            return
-        if meme_name not in self.meme_keywords:
-            yield event.plain_result(f"表情: {meme_name}不存在")
-            return
-        if meme_name in self.memes_disabled_list:
-            yield event.plain_result(f"表情: {meme_name}已被禁用")
-            return
-        self.memes_disabled_list.append(meme_name)
-        self.config.save_config(replace_config=self.config)
-        yield event.plain_result(f"已禁用表情: {meme_name}")
-        logger.info(f"当前禁用表情: {self.config['memes_disabled_list']}")
+        """禁用表情，可一次禁用多个；-g 仅本群，-u 仅自己"""
+        yield event.plain_result(self._toggle(event, "disable", True))
 
     @meme.command("enable")
     async def remove_supervisor(
         self, event: AstrMessageEvent, meme_name: str | None = None
     ):
-        """启用表情"""
-        if not meme_name:
-            yield event.plain_result("未指定要启用的表情")
-            return
-        if meme_name not in self.meme_keywords:
-            yield event.plain_result(f"表情: {meme_name}不存在")
-            return
-        if meme_name not in self.memes_disabled_list:
-            yield event.plain_result(f"表情: {meme_name}未被禁用")
-            return
-        self.memes_disabled_list.remove(meme_name)
-        self.config.save_config(replace_config=self.config)
-        yield event.plain_result(f"已启用表情: {meme_name}")
+        """启用表情，可一次启用多个；-g 仅本群，-u 仅自己"""
+        yield event.plain_result(self._toggle(event, "enable", False))
 
     @meme.command("blacklist")
     async def list_supervisors(self, event: AstrMessageEvent):
         """查看禁用的表情"""
-        yield event.plain_result(f"当前禁用的表情: {self.memes_disabled_list}")
+        lines = [f"当前禁用的表情: {self.disabled.global_keywords}"]
+        group_id = str(event.get_group_id() or "")
+        if group_id:
+            lines.append(f"本群禁用的表情: {self.disabled.scoped_keywords('group', group_id)}")
+        user_keywords = self.disabled.scoped_keywords("user", str(event.get_sender_id()))
+        if user_keywords:
+            lines.append(f"对你禁用的表情: {user_keywords}")
+        yield event.plain_result("\n".join(lines))
+
+    @meme.command("batch")
+    async def batch(self, event: AstrMessageEvent, keyword: str | None = None):
+        """一次生成多个表情，共用同一组图片与用户信息"""
+        names: list[str] = []
+        unknown: list[str] = []
+        for arg in self._command_args(event, "batch"):
+            if arg.startswith(("@", '"')):
+                continue
+            if self.registry.is_keyword(arg):
+                names.append(arg)
+            else:
+                unknown.append(arg)
+        group_id = str(event.get_group_id() or "")
+        sender_id = str(event.get_sender_id())
+        keywords = [
+            name
+            for name in dict.fromkeys(names)
+            if not self.disabled.is_disabled(name, group_id, sender_id)
+        ]
+        if unknown:
+            yield event.plain_result(f"表情: {'、'.join(unknown)}不存在")
+            return
+        if not keywords:
+            yield event.plain_result("未指定可用的表情")
+            return
+        if len(keywords) > self.batch_max_memes:
+            yield event.plain_result(f"一次最多生成 {self.batch_max_memes} 个表情")
+            return
+
+        try:
+            self.scheduler.admit(sender_id, group_id, cost=len(keywords))
+        except AdmissionRejected as e:
+            self.stats.incr(f"rejected_{e.reason}")
+            # 同一限流窗口内只提示一次，其余静默丢弃
+            if e.notify:
+                yield event.plain_result(e.message)
+            return
+
+        started_at = time.perf_counter()
+        memes = [meme for meme in [await self.registry.get(k) for k in keywords] if meme]
+        params = [self.registry.params(meme) for meme in memes]
+
+        # 只收集一次：头像、图片与用户信息由所有表情共用，批量模式不解析表情选项
+        with self.stats.timer("params"):
+            inputs = await self._collect_inputs(
+                event,
+                "",
+                ArgSchema(),
+                need_extra=any(p.uses_user_info for p in params),
+                min_images=max((p.min_images for p in params), default=0),
+            )
+            fitted = [
+                (await self._fit_inputs(event, p, inputs, meme.key))[:2]
+                for meme, p in zip(memes, params)
+            ]
+
+        async def _one(meme: "Meme", images: list[bytes], texts: list[str]):
+            self.stats.incr("match", meme.key)
+            return await self._generate(meme, images, texts, {}, session)
+
+        session = self._session(event)
+
+        results = await asyncio.gather(
+            *(_one(meme, images, texts) for meme, (images, texts) in zip(memes, fitted)),
+            return_exceptions=True,
+        )
+
+        chain: list = []
+        skipped: list[str] = []
+        failed: list[str] = []
+        total = 0
+        for meme, result in zip(memes, results):
+            if isinstance(result, RenderBusy):
+                self.stats.incr("render_busy", meme.key)
+                failed.append(meme.keywords[0])
+            elif isinstance(result, JobExpired):
+                self.stats.incr("expired", meme.key)
+                failed.append(meme.keywords[0])
+            elif isinstance(result, BaseException):
+                self.stats.incr("render_error", meme.key)
+                logger.error(f"批量生成表情 {meme.key} 失败: {result}")
+                failed.append(meme.keywords[0])
+            elif total + len(result[0]) > self.batch_max_bytes:
+                skipped.append(meme.keywords[0])
+            else:
+                total += len(result[0])
+                chain.append(await self._image_component(*result))
+
+        notes = []
+        if failed:
+            notes.append(f"生成失败: {'、'.join(failed)}")
+        if skipped:
+            notes.append(f"超出单次发送大小上限，已省略: {'、'.join(skipped)}")
+        if notes:
+            chain.append(Comp.Plain("\n".join(notes)))
+        if not chain:
+            return
+        with self.stats.timer("send"):
+            yield event.chain_result(chain)
+        self.stats.record("batch_total", (time.perf_counter() - started_at) * 1000)
+
+    @meme.command("stats")
+    async def show_stats(self, event: AstrMessageEvent):
+        """查看各阶段耗时统计"""
+        self._update_gauges()
+        yield event.plain_result(self.stats.report())
 
     @filter.event_message_type(EventMessageType.ALL)
     async def meme_handle(self, event: AstrMessageEvent):
@@ -242,123 +563,277 @@ class MemePlugin(Star):
         if not message_str:
             return
 
-        if self.fuzzy_match:
-            # 模糊匹配：检查关键词是否在消息字符串中
-            keyword = next((k for k in self.meme_keywords if k in message_str), None)
-        else:
-            # 精确匹配：检查关键词是否等于消息字符串的第一个单词
-            keyword = next(
-                (k for k in self.meme_keywords if k == message_str.split()[0]), None
+        # 模糊匹配：消息中含有关键词；精确匹配：关键词等于消息的第一个单词
+        with self.stats.timer("match"):
+            keyword = self.registry.keyword_index.match(
+                message_str, fuzzy=self.fuzzy_match
             )
 
-        if not keyword or keyword in self.memes_disabled_list:
+        if not keyword:
+            self.stats.incr("miss")
             return
+        if self.disabled.is_disabled(
+            keyword, str(event.get_group_id() or ""), str(event.get_sender_id())
+        ):
+            self.stats.incr("disabled")
+            return
+
+        if self.prerenderer:
+            self.prerenderer.touch()
+
+        # 准入控制：超出用户、群的频率限制或排队已满时直接拒绝，不再下载与合成
+        try:
+            self.scheduler.admit(str(event.get_sender_id()), str(event.get_group_id() or ""))
+        except AdmissionRejected as e:
+            self.stats.incr(f"rejected_{e.reason}")
+            # 同一限流窗口内只提示一次，其余静默丢弃
+            if e.notify:
+                yield event.plain_result(e.message)
+            return
+        started_at = time.perf_counter()
 
         # 匹配表情
-        meme = self._find_meme(keyword)
+        meme = await self.registry.get(keyword)
         if not meme:
             yield event.plain_result("未找到相关表情")
             return
 
+        self.stats.incr("match", meme.key)
+
         # 收集参数
-        images, texts, options = await self._get_params(event, keyword, meme)
+        try:
+            with self.stats.timer("params"):
+                images, texts, options = await self._get_params(event, keyword, meme)
+        except ArgError as e:
+            self.stats.incr("arg_error", meme.key)
+            yield event.plain_result(str(e))
+            return
 
         # 合成表情
         try:
-            image_io = await run_sync(meme)(images=images, texts=texts, args=options)
-
-        except MemeGeneratorException as e:
+            image, output_key = await self._generate(
+                meme, images, texts, options, self._session(event)
+            )
+        except JobExpired:
+            # 排队过久，请求者多半已不再关心，直接丢弃
+            self.stats.incr("expired", meme.key)
+            return
+        except RenderBusy:
+            self.stats.incr("render_busy", meme.key)
+            yield event.plain_result("当前生成表情的人太多了，请稍后再试")
+            return
+        except RenderError as e:
+            self.stats.incr("render_error", meme.key)
             logger.error(e.message)
             return
 
-        # 默认使用原始图片
-        image = image_io
+        # 发送图片
+        chain = [await self._image_component(image, output_key)]
+        with self.stats.timer("send"):
+            yield event.chain_result(chain)  # type: ignore
+        self.stats.record("total", (time.perf_counter() - started_at) * 1000)
+
+    def _render_key(
+        self, meme_key: str, images: List[bytes], texts: List[str], options: dict[str, Any]
+    ) -> str:
+        """结果缓存键，包含压缩参数，压缩配置变化时自然失效"""
+        output = asdict(self.compress_options) if self.is_compress_image else {}
+        return make_render_key(meme_key, images, texts, options, output)
+
+    async def _render_output(
+        self,
+        meme: "Meme",
+        images: List[bytes],
+        texts: List[str],
+        options: dict[str, Any],
+        session: str | None = None,
+    ) -> bytes:
+        """合成表情并按配置压缩，得到最终发送的图片
+
+        指定 session 时先在调度器中排队，只有合成本身占用槽位，压缩不占用。
+        """
+        if session is None:
+            with self.stats.timer("render", meme.key):
+                data = await self.render_engine.render(meme, images, texts, options)
+        else:
+            async with self.scheduler.slot(session):
+                with self.stats.timer("render", meme.key):
+                    data = await self.render_engine.render(meme, images, texts, options)
+        return await self._compress(data)
+
+    async def _compress(self, data: bytes) -> bytes:
+        """按配置压缩图片，失败或无需压缩时返回原图"""
+        if not self.is_compress_image:
+            return data
+        try:
+            # 编码较耗时，放到线程中执行，避免阻塞事件循环
+            with self.stats.timer("compress"):
+                compressed = await asyncio.to_thread(
+                    compress_image, io.BytesIO(data), self.compress_options
+                )
+        except Exception as e:
+            logger.warning(f"图片压缩失败，将发送原图: {e}")
+            return data
+        return compressed.getvalue() if compressed else data
+
+    async def _generate(
+        self,
+        meme: "Meme",
+        images: List[bytes],
+        texts: List[str],
+        options: dict[str, Any],
+        session: str | None = None,
+    ) -> tuple[bytes, str]:
+        """获取最终发送的图片，优先读取结果缓存，失败时抛出 RenderError
+
+        返回图片与其结果缓存键，缓存中保存的即是压缩后的图片。
+        缓存命中与合并到进行中的相同请求均不排队，只有真正合成时才占用调度槽位，
+        排队超时抛出 JobExpired。
+        """
+        rendered = False
 
-        # 如果启用压缩，则尝试压缩图片
-        if self.is_compress_image:
-            try:
-                # 如果压缩成功，则使用压缩后的图片，否则 image 保持为原始图片
-                compressed = self.compress_image(image_io)
-                if compressed:
-                    image = compressed
-            except Exception as e:
-                logger.warning(f"图片压缩失败，将发送原图: {e}")
+        async def _render() -> bytes:
+            nonlocal rendered
+            rendered = True
+            return await self._render_output(meme, images, texts, options, session)
 
-        # 发送图片
-        chain = [Comp.Image.fromBytes(image.getvalue())]
-        yield event.chain_result(chain)  # type: ignore
+        cache_key = self._render_key(meme.key, images, texts, options)
+        data = await self.render_cache.get_or_render(cache_key, _render)
+        self.stats.incr("render_cache_miss" if rendered else "render_cache_hit", meme.key)
+        if not rendered and self.prerenderer and self.prerenderer.claim(cache_key):
+            self.stats.incr("prerender_hit", meme.key)
+        return data, cache_key
 
-    def _find_meme(self, keyword: str) -> Meme | None:
-        """根据关键词寻找表情"""
-        for meme in self.memes:
-            if keyword == meme.key or any(k == keyword for k in meme.keywords):
-                return meme
+    async def _image_component(self, data: bytes, cache_key: str | None = None):
+        """生成发送用的图片消息段
 
-    async def _get_params(self, event: AstrMessageEvent, keyword: str, meme: Meme):
+        file 模式下优先直接使用磁盘结果缓存中的文件，否则写入暂存目录，
+        写入失败时退回内存发送。
+        """
+        if self.output_spool is None:
+            return Comp.Image.fromBytes(data)
+        path = await self.render_cache.path(cache_key) if cache_key else None
+        if path is None:
+            try:
+                path = await asyncio.to_thread(self.output_spool.spool, data)
+            except OSError as e:
+                logger.warning(f"写入待发送图片失败，改为直接发送: {e}")
+                return Comp.Image.fromBytes(data)
+        return Comp.Image.fromFileSystem(str(path.resolve()))
+
+    def _prerender_eligible(self, meme_key: str, n_images: int) -> bool:
+        """表情只需要这些头像、不需要文本与用户信息时才能预合成"""
+        info = self.registry.info(meme_key)
+        if info is None:
+            return False
+        params = info.params
+        return (
+            params.min_images <= n_images <= params.max_images
+            and params.min_texts == 0
+            and not params.uses_user_info
+        )
+
+    async def _prerender(self, meme_key: str, owners: tuple[str, ...]):
+        """预合成一个组合，写入结果缓存；返回 (缓存键, 新合成的大小)，已缓存时大小为 0"""
+        meme = await self.registry.get(meme_key)
+        if meme is None:
+            return None
+        images = []
+        for uid in owners:
+            avatar = await self.avatar_cache.get(uid)
+            if not avatar:
+                return None
+            images.append(avatar)
+        # 与真实请求使用相同的缓存键，缓存中即为压缩后的最终图片
+        cache_key = self._render_key(meme.key, images, [], {})
+        if await self.render_cache.get(cache_key) is not None:
+            return cache_key, 0
+        data = await self.render_cache.get_or_render(
+            cache_key, lambda: self._render_output(meme, images, [], {})
+        )
+        self.stats.incr("prerender", meme.key)
+        return cache_key, len(data)
+
+    async def _get_params(self, event: AstrMessageEvent, keyword: str, meme: "Meme"):
         """收集参数"""
-        images: list[bytes] = []
+        params = self.registry.params(meme)
+        # 表情用不到昵称、性别时跳过用户信息查询
+        inputs = await self._collect_inputs(
+            event,
+            keyword,
+            self.registry.schema(meme),
+            need_extra=params.uses_user_info,
+            min_images=params.min_images,
+            meme_key=meme.key,
+        )
+        images, texts, owners = await self._fit_inputs(event, params, inputs, meme.key)
+        # 输入只有头像的请求可以在空闲时预合成
+        if (
+            self.prerenderer
+            and images
+            and not texts
+            and not inputs.options
+            and all(owners)
+        ):
+            self.prerenderer.record(meme.key, tuple(owners))  # type: ignore
+        return images, texts, inputs.options
+
+    async def _collect_inputs(
+        self,
+        event: AstrMessageEvent,
+        keyword: str,
+        schema: ArgSchema,
+        need_extra: bool,
+        min_images: int,
+        meme_key: str = "",
+    ) -> "_Inputs":
+        """从消息中收集图片、文本、选项与用户信息
+
+        先按消息顺序解析出所有需要下载的图片、头像与用户信息，再并发获取，
+        最后按原顺序组装，保证图片与文本的先后关系不变。
+        meme_key 用于按表情统计下载耗时与失败次数，批量生成时为空。
+        """
         texts: List[str] = []
         options: dict[str, Any] = {}
 
-        params_type = meme.params_type
-        min_images = params_type.min_images  # noqa: F841
-        max_images = params_type.max_images
-        min_texts = params_type.min_texts
-        max_texts = params_type.max_texts
-        default_texts = params_type.default_texts
-
         messages = event.get_messages()
         send_id: str = event.get_sender_id()
         self_id: str = event.get_self_id()
         sender_name: str = event.get_sender_name()
 
         target_ids: list[str] = []
-        target_names: list[str] = []
-
-        async def _process_segment(_seg):
-            """从消息段中获取参数"""
+        image_jobs: list[Awaitable[bytes | None]] = []
+        image_owners: list[str | None] = []
+        extra_jobs: list[Awaitable[tuple[str, str] | None]] = []
+
+        def _add_target(target_id: str):
+            """添加被 @ 的用户：头像与额外参数"""
+            target_ids.append(target_id)
+            image_jobs.append(self.get_avatar(event, target_id, meme_key))
+            # 非数字 ID 使用随机头像，不视为固定头像
+            image_owners.append(target_id if target_id.isdigit() else None)
+            # 从消息平台获取 At 者的额外参数
+            if need_extra:
+                extra_jobs.append(self._get_extra(event, target_id=target_id))
+
+        def _process_segment(_seg):
+            """从消息段中解析参数"""
             if isinstance(_seg, Comp.Image):
-                if hasattr(_seg, "url") and _seg.url:
-                    img_url = _seg.url
-                    # 如果是有效的本地路径，则直接读取文件
-                    if Path(img_url).is_file():
-                        with open(img_url, "rb") as f:
-                            images.append(f.read())
-                    else:  # 否则尝试作为URL下载
-                        if msg_image := await self.download_image(img_url):
-                            images.append(msg_image)
-
-                elif hasattr(_seg, "file"):
-                    file_content = _seg.file
-                    if isinstance(file_content, str):
-                        # 如果是有效的本地路径，则直接读取文件
-                        if Path(file_content).is_file():
-                            with open(file_content, "rb") as f:
-                                images.append(f.read())
-                        else:  # 否则尝试作为Base64编码解析
-                            if file_content.startswith("base64://"):
-                                file_content = file_content[len("base64://") :]
-                            file_content = base64.b64decode(file_content)
-                    if isinstance(file_content, bytes):
-                        images.append(file_content)
+                image_jobs.append(self._load_segment_image(_seg, meme_key))
+                image_owners.append(None)
 
             elif isinstance(_seg, Comp.At):
                 seg_qq = str(_seg.qq)
                 if seg_qq != self_id:
-                    target_ids.append(seg_qq)
-                    if at_avatar := await self.get_avatar(event, seg_qq):
-                        images.append(at_avatar)
-                    # 从消息平台获取 At 者的额外参数
-                    if result := await self._get_extra(event, target_id=seg_qq):
-                        nickname, sex = result
-                        options["user_infos"] = [{"name": nickname, "gender": sex}]
-                        target_names.append(nickname)
+                    _add_target(seg_qq)
 
             elif isinstance(_seg, Comp.Plain):
                 plains: list[str] = _seg.text.strip().split()
                 param_index = 0
                 for text in plains:
-                    text = text.removeprefix(self.prefix).removeprefix(keyword)
+                    text = text.removeprefix(self.prefix)
+                    if keyword:
+                        text = text.removeprefix(keyword)
                     if not text:
                         continue
                     # 如果文本被引号包裹，则解析为文本参数
@@ -368,43 +843,62 @@ class MemePlugin(Star):
                     elif text.startswith("@"):
                         target_id = text[1:]
                         if target_id.isdigit():
-                            target_ids.append(target_id)
-                            if at_avatar := await self.get_avatar(event, target_id):
-                                images.append(at_avatar)
-                            if result := await self._get_extra(event, target_id=target_id):
-                                nickname, sex = result
-                                options["user_infos"] = [{"name": nickname, "gender": sex}]
-                                target_names.append(nickname)
-                    # 解析其他参数
-                    elif args_type := params_type.args_type:
-                        field_names = list(args_type.args_model.__annotations__.keys())
-                        if len(field_names) > param_index:
-                            # 下划线使用默认值
-                            if text != "_":
-                                # 替换常用中文参数
-                                if text in args_dict:
-                                    text = args_dict[text]
-                                logger.info(
-                                    f"参数 {field_names[param_index]} 使用 {text}"
-                                )
-                                options[field_names[param_index]] = text
-                            param_index += 1
-
-
-
-        # 如果有引用消息，也遍历之
-        reply_seg = next((seg for seg in messages if isinstance(seg, Comp.Reply)), None)
-        if reply_seg and reply_seg.chain:
-            for seg in reply_seg.chain:
-                await _process_segment(seg)
-
-        # 遍历原始消息段落
-        for seg in messages:
-            await _process_segment(seg)
+                            _add_target(target_id)
+                    # 解析其他参数，非法值直接报错，不再下载与合成
+                    elif len(schema) > param_index:
+                        # 下划线使用默认值
+                        if text != "_":
+                            # 替换常用中文参数并校验类型、可选值
+                            name, value = schema.parse(param_index, text)
+                            logger.info(f"参数 {name} 使用 {value}")
+                            options[name] = value
+                        param_index += 1
+
+        try:
+            # 如果有引用消息，也遍历之
+            reply_seg = next(
+                (seg for seg in messages if isinstance(seg, Comp.Reply)), None
+            )
+            if reply_seg and reply_seg.chain:
+                for seg in reply_seg.chain:
+                    _process_segment(seg)
+
+            # 遍历原始消息段落
+            for seg in messages:
+                _process_segment(seg)
+        except ArgError:
+            # 参数不合法，丢弃尚未执行的下载任务
+            for job in (*image_jobs, *extra_jobs):
+                job.close()  # type: ignore
+            raise
 
         # 从消息平台获取发送者的额外参数
-        if not target_ids:
-            if result := await self._get_extra(event, target_id=send_id):
+        if not target_ids and need_extra:
+            extra_jobs.append(self._get_extra(event, target_id=send_id))
+
+        # 按解析出的图片数量预判是否需要发送者与 bot 的头像，与其他下载一起进行
+        fallback_ids = [send_id, self_id][: max(min_images - len(image_jobs), 0)]
+        fallback_jobs = [self.get_avatar(event, uid, meme_key) for uid in fallback_ids]
+
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def _bounded(job: Awaitable):
+            async with semaphore:
+                return await job
+
+        results = await asyncio.gather(
+            *(_bounded(job) for job in (*image_jobs, *extra_jobs, *fallback_jobs))
+        )
+        image_results = results[: len(image_jobs)]
+        extra_results = results[len(image_jobs) : len(image_jobs) + len(extra_jobs)]
+        fallback_avatars = dict(zip(fallback_ids, results[len(image_jobs) + len(extra_jobs) :]))
+
+        images: list[bytes] = [image for image in image_results if image]
+        owners = [owner for owner, image in zip(image_owners, image_results) if image]
+
+        target_names: list[str] = []
+        for result in extra_results:
+            if result:
                 nickname, sex = result
                 options["user_infos"] = [{"name": nickname, "gender": sex}]
                 target_names.append(nickname)
@@ -412,26 +906,85 @@ class MemePlugin(Star):
         if not target_names:
             target_names.append(sender_name)
 
+        return _Inputs(images, texts, options, target_names, fallback_avatars, owners)
+
+    async def _fit_inputs(
+        self,
+        event: AstrMessageEvent,
+        params: MemeParams,
+        inputs: "_Inputs",
+        meme_key: str = "",
+    ) -> tuple[List[bytes], List[str], List[str | None]]:
+        """按表情的参数要求补齐、截断图片与文本，不修改 inputs 中的列表
+
+        同时返回每张图片对应的头像所属用户。
+        """
+        send_id: str = event.get_sender_id()
+        self_id: str = event.get_self_id()
+        images = list(inputs.images)
+        owners = list(inputs.image_owners)
+        fallback_avatars = inputs.fallback_avatars
+
         # 确保图片数量在 min_images 到 max_images 之间 (参数足够即可)
-        if len(images) < min_images:
-            if use_avatar := await self.get_avatar(event, send_id):
-                images.insert(0, use_avatar)
-        if len(images) < min_images:
-            if bot_avatar := await self.get_avatar(event, self_id):
-                images.insert(0, bot_avatar)
-        meme_images = images[:max_images]
+        # 预判之外的缺口 (如下载失败) 再补充获取
+        for uid in (send_id, self_id):
+            if len(images) >= params.min_images:
+                break
+            if uid not in fallback_avatars:
+                fallback_avatars[uid] = await self.get_avatar(event, uid, meme_key)
+            if avatar := fallback_avatars[uid]:
+                images.insert(0, avatar)
+                owners.insert(0, uid if uid.isdigit() else None)
+        meme_images = images[: params.max_images]
 
         # 确保文本数量在 min_texts 到 max_texts 之间 (参数足够即可)
-        if len(texts) < min_texts and target_names:
-            texts.extend(target_names)
-        if len(texts) < min_texts and default_texts:
-            texts.extend(default_texts)
-        texts = texts[:max_texts]
+        texts = list(inputs.texts)
+        if len(texts) < params.min_texts and inputs.target_names:
+            texts.extend(inputs.target_names)
+        if len(texts) < params.min_texts and params.default_texts:
+            texts.extend(params.default_texts)
+        texts = texts[: params.max_texts]
+
+        return meme_images, texts, owners[: params.max_images]
 
-        return meme_images, texts, options
+    async def _load_segment_image(self, seg: Comp.Image, meme_key: str = "") -> bytes | None:
+        """读取图片消息段中的图片，并在进入合成前校验、缩小"""
+        try:
+            data = await self._read_segment_image(seg, meme_key)
+            return await self.ingestor.normalize(data) if data else None
+        except IngestError as e:
+            logger.warning(f"已忽略图片: {e}")
+        except Exception as e:
+            logger.error(f"读取图片失败: {e}")
+
+    async def _read_segment_image(self, seg: Comp.Image, meme_key: str = "") -> bytes | None:
+        """读取图片消息段的原始数据"""
+        if hasattr(seg, "url") and seg.url:
+            img_url = seg.url
+            # 如果是有效的本地路径，则直接读取文件
+            if _is_local_file(img_url):
+                return await self.ingestor.read_file(img_url)
+            # 否则尝试作为URL下载
+            return await self.download_image(img_url, meme_key)
+
+        elif hasattr(seg, "file"):
+            file_content = seg.file
+            if isinstance(file_content, str):
+                # 如果是有效的本地路径，则直接读取文件
+                if _is_local_file(file_content):
+                    return await self.ingestor.read_file(file_content)
+                # 否则尝试作为Base64编码解析
+                file_content = await self.ingestor.decode_base64(file_content)
+            if isinstance(file_content, bytes):
+                return file_content
+
+    async def _get_extra(self, event: AstrMessageEvent, target_id: str):
+        """从消息平台获取参数，优先从缓存读取"""
+        with self.stats.timer("extra"):
+            return await self.user_info_cache.get(event, target_id)
 
     @staticmethod
-    async def _get_extra(event: AstrMessageEvent, target_id: str):
+    async def _fetch_extra(event: AstrMessageEvent, target_id: str):
         """从消息平台获取参数"""
         if event.get_platform_name() == "aiocqhttp":
             from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
@@ -446,53 +999,40 @@ class MemePlugin(Star):
             return nickname, sex
         # TODO 适配更多消息平台
 
-    @staticmethod
-    def compress_image(image_io: io.BytesIO, max_size: int = 512) -> io.BytesIO | None:
-        """压缩静态图片或 GIF 到 max_size 大小"""
-        try:
-            # 将输入的 bytes 加载为图片
-            img = Image.open(image_io)
-            output = io.BytesIO()
-
-            if img.format == "GIF":
-                return
-            else:
-                # 如果是静态图片，检查尺寸并压缩
-                if img.width > max_size or img.height > max_size:
-                    img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-                # 保存处理后的图片到内存中的 BytesIO 对象
-                img.save(output, format=img.format)
-
-            # 返回处理后的图片数据 (bytes)
-            return output
-
-        except Exception as e:
-            raise ValueError(f"图片压缩失败: {e}")
-
-    @staticmethod
-    async def download_image(url: str) -> bytes | None:
+    async def download_image(self, url: str, meme_key: str = "") -> bytes | None:
         """下载图片"""
         url = url.replace("https://", "http://")
         try:
-            async with aiohttp.ClientSession() as client:
-                response = await client.get(url)
-                img_bytes = await response.read()
-                return img_bytes
+            with self.stats.timer("image_download", meme_key):
+                return await self.ingestor.download(url)
         except Exception as e:
+            self.stats.incr("download_failed", meme_key)
             logger.error(f"图片下载失败: {e}")
 
-    @staticmethod
-    async def get_avatar(event: AstrMessageEvent, user_id: str) -> bytes | None:
-        """下载头像"""
+    async def get_avatar(
+        self, event: AstrMessageEvent, user_id: str, meme_key: str = ""
+    ) -> bytes | None:
+        """获取头像，优先从缓存读取"""
         # if event.get_platform_name() == "aiocqhttp":
-        if not user_id.isdigit():
-            user_id = "".join(random.choices("0123456789", k=9))
-        avatar_url = f"https://q4.qlogo.cn/headimg_dl?dst_uin={user_id}&spec=640"
+        with self.stats.timer("avatar", meme_key):
+            if not user_id.isdigit():
+                # 随机头像无需缓存
+                avatar = await self._download_avatar(
+                    "".join(random.choices("0123456789", k=9))
+                )
+            else:
+                avatar = await self.avatar_cache.get(user_id)
+        # 下载由头像缓存合并、共享，失败次数在此按表情计入；下载失败但有旧头像时不计
+        if avatar is None:
+            self.stats.incr("download_failed", meme_key)
+        return avatar
+
+    async def _download_avatar(self, user_id: str) -> bytes | None:
+        """下载头像"""
+        avatar_url = self.avatar_url.format(user_id=user_id)
         try:
-            async with aiohttp.ClientSession() as client:
-                response = await client.get(avatar_url, timeout=10)
-                response.raise_for_status()
-                return await response.read()
+            with self.stats.timer("avatar_download"):
+                return await self.http.get_bytes(avatar_url)
         except Exception as e:
             logger.error(f"下载头像失败: {e}")
             return None
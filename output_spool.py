@@ -0,0 +1,52 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+
+from .ingest import sniff_image_type
+
+
+class OutputSpool:
+    """待发送图片的暂存目录
+
+    图片按内容的 sha256 命名写入文件，以文件路径交给消息平台，避免在内存中
+    再复制并编码为 Base64。平台何时读取完文件无从得知，因此按时间清理：
+    写入或复用时刷新修改时间，超过 ttl 未使用的文件在之后的写入中顺带删除。
+    """
+
+    def __init__(self, root: Path, ttl: float = 600):
+        self.root = root
+        self.ttl = ttl
+        self._pruned_at = 0.0
+
+    def spool(self, data: bytes) -> Path:
+        """写入图片并返回文件路径，相同内容只保存一份"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        suffix = sniff_image_type(data[:16]) or "bin"
+        path = self.root / f"{hashlib.sha256(data).hexdigest()}.{suffix}"
+        if path.exists():
+            os.utime(path)
+        else:
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        now = time.time()
+        if now - self._pruned_at > self.ttl / 2:
+            self._pruned_at = now
+            self.prune()
+        return path
+
+    def prune(self) -> int:
+        """删除超过 ttl 未使用的文件，返回删除数量"""
+        now = time.time()
+        removed = 0
+        if not self.root.is_dir():
+            return 0
+        for path in self.root.iterdir():
+            try:
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
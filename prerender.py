@@ -0,0 +1,145 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+
+from astrbot import logger
+
+# (表情 key, 按顺序作为输入图片的头像所属用户)
+Pair = tuple[str, tuple[str, ...]]
+
+
+class Prerenderer:
+    """空闲时预先合成热门表情与常被使用的头像的组合
+
+    - 记录每个表情与每组头像 (通常是被 @ 的用户) 的触发次数，每小时衰减一半
+    - 空闲 idle_seconds 秒且没有排队、合成中的任务时，按 表情热度 x 头像热度
+      依次合成排名靠前的组合，结果写入合成结果缓存，之后的真实请求直接命中
+    - 每次合成前检查是否仍然空闲，一旦有真实请求立即停止；已提交的单个合成
+      无法中断，因此同一时间最多只有一个预合成任务
+    - 每小时的合成耗时与结果总大小均有上限
+    """
+
+    def __init__(
+        self,
+        render: Callable[[str, tuple[str, ...]], Awaitable[tuple[str, int] | None]],
+        eligible: Callable[[str, int], bool],
+        busy: Callable[[], bool],
+        max_pairs: int = 20,
+        idle_seconds: float = 60,
+        cpu_seconds_per_hour: float = 120,
+        max_bytes: int = 32 * 1024 * 1024,
+        top_memes: int = 10,
+        top_targets: int = 10,
+    ):
+        self.render = render
+        self.eligible = eligible
+        self.busy = busy
+        self.max_pairs = max_pairs
+        self.idle_seconds = idle_seconds
+        self.cpu_seconds_per_hour = cpu_seconds_per_hour
+        self.max_bytes = max_bytes
+        self.top_memes = top_memes
+        self.top_targets = top_targets
+
+        self.meme_counts: Counter[str] = Counter()
+        self.target_counts: Counter[tuple[str, ...]] = Counter()
+        self.last_activity = time.monotonic()
+        # 已预合成的组合 -> (结果缓存键, 大小)
+        self._done: dict[Pair, tuple[str, int]] = {}
+        self._keys: set[str] = set()
+        self._spent = 0.0
+        self._window_start = time.monotonic()
+
+    def touch(self):
+        """有真实请求到达"""
+        self.last_activity = time.monotonic()
+
+    def record(self, meme_key: str, targets: tuple[str, ...]):
+        """记录一次可预合成的请求：没有文本、选项，图片全部来自头像"""
+        self.meme_counts[meme_key] += 1
+        self.target_counts[targets] += 1
+
+    def claim(self, cache_key: str) -> bool:
+        """结果缓存命中时调用，返回该结果是否来自预合成"""
+        if cache_key in self._keys:
+            self._keys.discard(cache_key)
+            return True
+        return False
+
+    def idle(self) -> bool:
+        return (
+            time.monotonic() - self.last_activity >= self.idle_seconds and not self.busy()
+        )
+
+    def _decay(self):
+        """每小时衰减一次计数并重置预算"""
+        now = time.monotonic()
+        if now - self._window_start < 3600:
+            return
+        self._window_start = now
+        self._spent = 0.0
+        for counter in (self.meme_counts, self.target_counts):
+            for key in list(counter):
+                counter[key] //= 2
+                if counter[key] <= 0:
+                    del counter[key]
+        # 缓存可能已被淘汰，下一轮重新检查
+        self._done.clear()
+        self._keys.clear()
+
+    def candidates(self) -> list[Pair]:
+        """按热度排序的待预合成组合"""
+        scored = [
+            (meme_n * target_n, (meme_key, targets))
+            for meme_key, meme_n in self.meme_counts.most_common(self.top_memes)
+            for targets, target_n in self.target_counts.most_common(self.top_targets)
+            if self.eligible(meme_key, len(targets))
+        ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [pair for _, pair in scored[: self.max_pairs]]
+
+    def _used_bytes(self) -> int:
+        return sum(size for _, size in self._done.values())
+
+    async def run_once(self) -> int:
+        """执行一轮预合成，返回新合成的数量"""
+        self._decay()
+        count = 0
+        for pair in self.candidates():
+            if pair in self._done:
+                continue
+            # 有真实请求或超出预算时立即停止
+            if not self.idle():
+                break
+            if self._spent >= self.cpu_seconds_per_hour or self._used_bytes() >= self.max_bytes:
+                break
+            started_at = time.perf_counter()
+            try:
+                result = await self.render(*pair)
+            except Exception as e:
+                logger.debug(f"预合成 {pair} 失败: {e}")
+                result = None
+            self._spent += time.perf_counter() - started_at
+            if result is None:
+                # 失败或输入不可用，本小时内不再尝试
+                self._done[pair] = ("", 0)
+                continue
+            cache_key, size = result
+            self._done[pair] = (cache_key, size)
+            if size:
+                self._keys.add(cache_key)
+                count += 1
+        return count
+
+    async def run(self, interval: float = 10):
+        """后台循环"""
+        while True:
+            await asyncio.sleep(interval)
+            if not self.idle():
+                continue
+            try:
+                if count := await self.run_once():
+                    logger.debug(f"空闲时预合成了 {count} 个表情")
+            except Exception as e:
+                logger.warning(f"预合成失败: {e}")
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Literal
+
+from astrbot import logger
+
+from .cache import BlobStore, ByteLRU, Singleflight
+from .resources import meme_generator_version
+
+if TYPE_CHECKING:
+    from meme_generator import Meme
+
+
+@dataclass
+class MemeProperties:
+    disabled: bool = False
+    labels: list[Literal["new", "hot"]] = field(default_factory=list)
+
+
+# TODO new 标签、hot 标签
+
+
+def _keywords_pinyin(meme: "Meme") -> str:
+    try:
+        from pypinyin import lazy_pinyin
+    except ImportError:
+        return "".join(meme.keywords)
+    return "".join(lazy_pinyin("".join(meme.keywords)))
+
+
+SORT_KEYS: dict[str, Callable[["Meme"], object]] = {
+    "key": lambda meme: meme.key,
+    "keywords": lambda meme: "".join(meme.keywords),
+    "keywords_pinyin": _keywords_pinyin,
+    "date_created": lambda meme: getattr(meme, "date_created", None) or 0,
+    "date_modified": lambda meme: getattr(meme, "date_modified", None) or 0,
+}
+
+
+class PreviewCache:
+    """表情列表图与表情预览图缓存
+
+    两者的输出只取决于 meme_generator 版本、表情本身、排序方式与禁用列表，
+    因此按这些内容计算缓存键，禁用列表变化或升级时自然失效。
+    可选地在启动后于后台预先生成，并持久化到磁盘，过期的磁盘缓存在启动时清理。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        disk_ttl: float = 7 * 24 * 3600,
+    ):
+        self._memory: ByteLRU[str, bytes] = ByteLRU(max_memory_bytes)
+        self._disk = BlobStore(cache_dir) if cache_dir else None
+        self.disk_ttl = disk_ttl
+        self._flight: Singleflight[str, bytes] = Singleflight()
+        self._version = meme_generator_version()
+
+    async def _get(self, key: str, render: Callable[[], bytes]) -> bytes:
+        if (data := self._memory.get(key)) is not None:
+            return data
+
+        async def _load() -> bytes:
+            entry = await asyncio.to_thread(self._disk.read, key) if self._disk else None
+            if entry:
+                data = entry[0]
+            else:
+                data = await asyncio.to_thread(render)
+                if self._disk:
+                    try:
+                        await asyncio.to_thread(self._disk.write, key, data)
+                    except OSError as e:
+                        logger.warning(f"预览图写入磁盘缓存失败: {e}")
+            self._memory.put(key, data, len(data))
+            return data
+
+        return await self._flight.do(key, _load)
+
+    async def get_list(
+        self, memes: list["Meme"], disabled_list: list[str], sort_by: str = "key"
+    ) -> bytes:
+        """获取表情列表图"""
+        sort_key = SORT_KEYS.get(sort_by, SORT_KEYS["key"])
+        memes = sorted(memes, key=sort_key)  # type: ignore
+        disabled = set(disabled_list)
+        # 所有关键词都被禁用的表情无法触发，在列表中标记为禁用
+        meme_list = [
+            (meme, MemeProperties(disabled=all(k in disabled for k in meme.keywords)))
+            for meme in memes
+        ]
+        key = "list:" + hashlib.sha256(
+            json.dumps(
+                [
+                    self._version,
+                    [(meme.key, meme.keywords, props.disabled) for meme, props in meme_list],
+                ],
+                ensure_ascii=False,
+            ).encode()
+        ).hexdigest()
+
+        def _render() -> bytes:
+            from meme_generator.utils import render_meme_list
+
+            return render_meme_list(
+                meme_list=meme_list,  # type: ignore
+                text_template="{index}.{keywords}",
+                add_category_icon=True,
+            ).getvalue()
+
+        return await self._get(key, _render)
+
+    async def get_preview(self, meme: "Meme") -> bytes:
+        """获取表情预览图"""
+        key = f"preview:{self._version}:{meme.key}:{getattr(meme, 'date_modified', '')}"
+        return await self._get(key, lambda: meme.generate_preview().getvalue())  # type: ignore
+
+    async def prune(self) -> int:
+        """清理磁盘上过期的列表图与预览图"""
+        if not self._disk:
+            return 0
+        return await asyncio.to_thread(self._disk.prune, self.disk_ttl)
+
+    async def warm(self, memes: list["Meme"], disabled_list: list[str], sort_by: str):
+        """后台预先生成列表图与所有预览图"""
+        try:
+            await self.get_list(memes, disabled_list, sort_by)
+        except Exception as e:
+            logger.warning(f"预生成表情列表失败: {e}")
+        count = 0
+        for meme in memes:
+            try:
+                await self.get_preview(meme)
+                count += 1
+            except Exception as e:
+                logger.debug(f"预生成表情 {meme.key} 预览失败: {e}")
+        logger.info(f"已预生成 {count} 个表情预览")
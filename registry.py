@@ -0,0 +1,213 @@
+import asyncio
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable
+
+from astrbot import logger
+
+from .args_schema import ArgSchema
+from .keyword_index import KeywordIndex
+from .resources import meme_generator_version
+
+if TYPE_CHECKING:
+    from meme_generator import Meme
+
+# 清单格式版本，字段变化时递增
+MANIFEST_VERSION = 2
+
+
+@dataclass(frozen=True)
+class MemeParams:
+    """预先提取的表情参数信息"""
+
+    min_images: int
+    max_images: int
+    min_texts: int
+    max_texts: int
+    default_texts: list[str] = field(default_factory=list)
+    # 是否需要从消息平台获取用户信息 (user_infos 参数或以昵称作为文本)
+    uses_user_info: bool = False
+
+    @classmethod
+    def from_meme(cls, meme: "Meme") -> "MemeParams":
+        params_type = meme.params_type
+        args_type = getattr(params_type, "args_type", None)
+        model_fields = getattr(args_type.args_model, "__fields__", {}) if args_type else {}
+        return cls(
+            min_images=params_type.min_images,
+            max_images=params_type.max_images,
+            min_texts=params_type.min_texts,
+            max_texts=params_type.max_texts,
+            default_texts=list(params_type.default_texts),
+            uses_user_info=params_type.min_texts > 0 or "user_infos" in model_fields,
+        )
+
+
+@dataclass(frozen=True)
+class MemeInfo:
+    """无需加载表情即可使用的表情信息，可写入清单"""
+
+    key: str
+    keywords: tuple[str, ...]
+    params: MemeParams
+
+    @classmethod
+    def from_meme(cls, meme: "Meme") -> "MemeInfo":
+        return cls(meme.key, tuple(meme.keywords), MemeParams.from_meme(meme))
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "MemeInfo":
+        return cls(data["key"], tuple(data["keywords"]), MemeParams(**data["params"]))
+
+
+class MemeRegistry:
+    """表情注册表：key 与所有关键词到表情的 O(1) 映射
+
+    可以直接由表情构建，也可以由上次启动保存的清单构建；后者在首次需要表情时
+    才在线程中导入 meme_generator 并加载全部表情，加载后若与清单不一致则以实际为准。
+    """
+
+    def __init__(
+        self,
+        infos: Iterable[MemeInfo],
+        memes: Iterable["Meme"] | None = None,
+        manifest_path: Path | None = None,
+    ):
+        self.manifest_path = manifest_path
+        self._memes: dict[str, "Meme"] | None = None
+        self._load_task: asyncio.Task | None = None
+        self._schemas: dict[str, ArgSchema] = {}
+        self._index(list(infos))
+        if memes is not None:
+            self._set_memes(list(memes))
+
+    def _set_memes(self, memes: list["Meme"]):
+        self._memes = {meme.key: meme for meme in memes}
+        # 加载表情时即预编译全部参数表
+        self._schemas = {
+            meme.key: ArgSchema.from_args_type(getattr(meme.params_type, "args_type", None))
+            for meme in memes
+        }
+
+    def _index(self, infos: list[MemeInfo]):
+        self.infos = infos
+        self.keywords: list[str] = [k for info in infos for k in info.keywords]
+        self._by_name: dict[str, MemeInfo] = {}
+        self._params: dict[str, MemeParams] = {}
+        for info in infos:
+            self._params[info.key] = info.params
+            # 名称冲突时先注册的表情优先
+            for name in (info.key, *info.keywords):
+                self._by_name.setdefault(name, info)
+        self._keyword_set: frozenset[str] = frozenset(self.keywords)
+        self.keyword_index = KeywordIndex(self.keywords)
+
+    @classmethod
+    def from_memes(
+        cls, memes: Iterable["Meme"], manifest_path: Path | None = None
+    ) -> "MemeRegistry":
+        memes = list(memes)
+        return cls((MemeInfo.from_meme(meme) for meme in memes), memes, manifest_path)
+
+    @classmethod
+    def from_manifest(cls, manifest_path: Path) -> "MemeRegistry | None":
+        """从清单构建，清单不存在或版本不符时返回 None"""
+        try:
+            data = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if (
+                data.get("version") != MANIFEST_VERSION
+                or data.get("meme_generator") != meme_generator_version()
+            ):
+                return None
+            infos = [MemeInfo.from_dict(item) for item in data["memes"]]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"表情清单不可用: {e}")
+            return None
+        return cls(infos, manifest_path=manifest_path)
+
+    def save_manifest(self):
+        """保存清单，供下次启动使用"""
+        if not self.manifest_path:
+            return
+        data = {
+            "version": MANIFEST_VERSION,
+            "meme_generator": meme_generator_version(),
+            "memes": [asdict(info) for info in self.infos],
+        }
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.manifest_path)
+
+    async def save_manifest_async(self):
+        """在线程中保存清单，失败只记录警告"""
+        try:
+            await asyncio.to_thread(self.save_manifest)
+        except OSError as e:
+            logger.warning(f"保存表情清单失败: {e}")
+
+    def __len__(self) -> int:
+        return len(self.infos)
+
+    @property
+    def loaded(self) -> bool:
+        return self._memes is not None
+
+    async def load(self) -> list["Meme"]:
+        """加载全部表情，并发调用只加载一次"""
+        if self._memes is None:
+            if self._load_task is None:
+                self._load_task = asyncio.ensure_future(self._load())
+            try:
+                await asyncio.shield(self._load_task)
+            except Exception:
+                self._load_task = None
+                raise
+        assert self._memes is not None
+        return list(self._memes.values())
+
+    async def _load(self):
+        def _get_memes() -> list["Meme"]:
+            from meme_generator import get_memes
+
+            return get_memes()
+
+        memes = await asyncio.to_thread(_get_memes)
+        infos = [MemeInfo.from_meme(meme) for meme in memes]
+        if infos != self.infos:
+            logger.info("表情清单已过期，已按实际加载的表情更新")
+            self._index(infos)
+            await self.save_manifest_async()
+        self._set_memes(memes)
+
+    def info(self, name: str) -> MemeInfo | None:
+        """根据 key 或关键词获取表情信息，无需加载表情"""
+        return self._by_name.get(name)
+
+    async def get(self, name: str) -> "Meme | None":
+        """根据 key 或关键词获取表情"""
+        if name not in self._by_name:
+            return None
+        await self.load()
+        info = self._by_name.get(name)
+        return self._memes.get(info.key) if info and self._memes else None
+
+    def is_keyword(self, name: str) -> bool:
+        """是否为某个表情的关键词"""
+        return name in self._keyword_set
+
+    def schema(self, meme: "Meme") -> ArgSchema:
+        """获取表情预编译的参数表"""
+        schema = self._schemas.get(meme.key)
+        if schema is None:
+            args_type = getattr(meme.params_type, "args_type", None)
+            schema = self._schemas[meme.key] = ArgSchema.from_args_type(args_type)
+        return schema
+
+    def params(self, meme: "Meme | MemeInfo") -> MemeParams:
+        """获取表情的参数信息"""
+        params = self._params.get(meme.key)
+        if params is None:
+            params = self._params[meme.key] = MemeParams.from_meme(meme)  # type: ignore
+        return params
@@ -0,0 +1,188 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, Literal
+
+from astrbot import logger
+
+if TYPE_CHECKING:
+    from meme_generator import Meme
+
+
+class RenderError(Exception):
+    """表情合成失败"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class RenderBusy(RenderError):
+    """合成队列已满"""
+
+
+class RenderTimeout(RenderError):
+    """合成超时"""
+
+
+# 子进程内的表情表，由 _init_worker 初始化
+_worker_memes: dict[str, "Meme"] = {}
+
+
+def _init_worker():
+    from meme_generator import get_memes
+
+    _worker_memes.update({meme.key: meme for meme in get_memes()})
+
+
+def _render_in_worker(
+    key: str, images: list[bytes], texts: list[str], args: dict[str, Any]
+) -> bytes:
+    meme = _worker_memes.get(key)
+    if meme is None:
+        raise RenderError(f"子进程中未找到表情: {key}")
+    return _render(meme, images, texts, args)
+
+
+def _render(
+    meme: "Meme", images: list[bytes], texts: list[str], args: dict[str, Any]
+) -> bytes:
+    from meme_generator.exception import MemeGeneratorException
+
+    # MemeGeneratorException 不一定能跨进程序列化，统一转换为 RenderError
+    try:
+        return meme(images=images, texts=texts, args=args).getvalue()
+    except MemeGeneratorException as e:
+        raise RenderError(e.message) from None
+
+
+class RenderEngine:
+    """表情合成引擎
+
+    - process 模式：在独立进程池中合成，充分利用多核
+    - thread 模式：在线程池中合成，与原先 run_sync 行为一致
+    - 排队任务超过 queue_size 时直接拒绝，避免无限堆积
+    - process 模式下合成超时会结束整个进程池并重建，避免卡死的子进程一直占用槽位
+    """
+
+    # workers 为 0 时的默认上限：每个子进程都会加载全部表情，核数多时内存占用成倍增加
+    DEFAULT_MAX_WORKERS = 4
+
+    def __init__(
+        self,
+        mode: Literal["process", "thread"] = "process",
+        workers: int = 0,
+        queue_size: int = 16,
+        timeout: float = 60,
+    ):
+        self.mode = mode
+        self.workers = workers or min(os.cpu_count() or 1, self.DEFAULT_MAX_WORKERS)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self._executor: Executor | None = None
+        self._slots = asyncio.Semaphore(self.workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="meme_render"
+                )
+            logger.info(f"表情合成引擎已启动: {self.mode} x {self.workers}")
+        return self._executor
+
+    async def render(
+        self,
+        meme: "Meme",
+        images: list[bytes],
+        texts: list[str],
+        args: dict[str, Any],
+    ) -> bytes:
+        """提交合成任务并等待结果"""
+        if self.pending >= self.workers + self.queue_size:
+            raise RenderBusy("表情合成任务过多")
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+            return await self._submit(meme, images, texts, args)
+        finally:
+            self.pending -= 1
+
+    async def _submit(
+        self,
+        meme: "Meme",
+        images: list[bytes],
+        texts: list[str],
+        args: dict[str, Any],
+    ) -> bytes:
+        loop = asyncio.get_running_loop()
+        # 记住本次使用的执行器，出错时只回收它，不影响其他任务已重建的新进程池
+        executor = self._get_executor()
+        try:
+            if self.mode == "process":
+                future = executor.submit(
+                    _render_in_worker, meme.key, images, texts, args
+                )
+            else:
+                future = executor.submit(_render, meme, images, texts, args)
+        except BrokenProcessPool:
+            self._slots.release()
+            logger.error("表情合成进程池异常，正在重建")
+            self._recycle(executor)
+            raise RenderError(f"表情 {meme.key} 合成失败: 进程池异常") from None
+        except Exception:
+            self._slots.release()
+            raise
+        # 超时后任务可能仍在执行，直到其真正结束才释放合成槽位
+        future.add_done_callback(
+            lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._slots.release)
+        )
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            if self.mode == "process":
+                # 超时的子进程无法单独中断，结束整个进程池，其上的任务随之失败并释放槽位
+                logger.error(f"表情 {meme.key} 合成超时，正在重建进程池")
+                self._kill_workers(executor)
+                self._recycle(executor)
+            raise RenderTimeout(f"表情 {meme.key} 合成超时") from None
+        except BrokenProcessPool:
+            # 子进程异常退出，重建进程池
+            logger.error("表情合成进程池异常，正在重建")
+            self._recycle(executor)
+            raise RenderError(f"表情 {meme.key} 合成失败: 进程池异常") from None
+
+    def _recycle(self, executor: Executor):
+        """关闭出错的执行器，下次提交时重建
+
+        不取消排队中的任务：进程池已损坏时它们会以 BrokenProcessPool 结束，
+        由各自的调用方转换为 RenderError，而不是以 CancelledError 中断调用方。
+        """
+        if self._executor is executor:
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _kill_workers(executor: Executor):
+        """结束进程池中的全部子进程"""
+        processes = getattr(executor, "_processes", None) or {}
+        for process in list(processes.values()):
+            try:
+                process.terminate()
+            except Exception as e:
+                logger.debug(f"结束合成子进程失败: {e}")
+
+    def shutdown(self):
+        """关闭执行器"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
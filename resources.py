@@ -0,0 +1,108 @@
+import asyncio
+import importlib
+import importlib.util
+import json
+import os
+import time
+from importlib import metadata
+from pathlib import Path
+
+from astrbot import logger
+
+
+def _resource_root() -> Path | None:
+    """meme_generator 内置表情资源目录，不导入 meme_generator"""
+    spec = importlib.util.find_spec("meme_generator")
+    if not spec or not spec.submodule_search_locations:
+        return None
+    return Path(next(iter(spec.submodule_search_locations))) / "memes"
+
+
+def meme_generator_version() -> str:
+    """已安装的 meme_generator 版本，不导入 meme_generator"""
+    try:
+        return metadata.version("meme_generator")
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+def _meme_dirs(root: Path) -> list[str]:
+    """表情目录名称，新增表情的目录可能只有 .py 文件，单看资源文件无法发现"""
+    try:
+        return sorted(
+            entry.name
+            for entry in os.scandir(root)
+            if entry.is_dir() and entry.name != "__pycache__"
+        )
+    except OSError:
+        return []
+
+
+def _scan(root: Path) -> dict[str, list[int]]:
+    """只读取文件元数据 (大小、修改时间)，不读取内容"""
+    files: dict[str, list[int]] = {}
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != "__pycache__":
+                    stack.append(Path(entry.path))
+            elif not entry.name.endswith((".py", ".pyc")):
+                stat = entry.stat()
+                files[os.path.relpath(entry.path, root)] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+async def check_resources_incremental(state_path: Path, interval: float):
+    """按需检查表情资源
+
+    与上次检查后保存的 meme_generator 版本、表情目录与资源文件清单比对，
+    均无变化且距上次检查不足 interval 秒时跳过；
+    否则执行 meme_generator 的完整检查并更新清单。
+    """
+    start = time.perf_counter()
+    root = _resource_root()
+    version = meme_generator_version()
+    current = await asyncio.to_thread(_scan, root) if root else {}
+    dirs = await asyncio.to_thread(_meme_dirs, root) if root else []
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = {}
+
+    previous: dict = state.get("files", {})
+    changed = {k for k in current.keys() | previous.keys() if current.get(k) != previous.get(k)}
+    upgraded = state.get("version") != version or state.get("dirs") != dirs
+    expired = time.time() - state.get("checked_at", 0) > interval
+    if current and not changed and not upgraded and not expired:
+        logger.info(
+            f"memes 资源文件无变化，跳过检查 ({len(current)} 个文件，"
+            f"{(time.perf_counter() - start) * 1000:.0f} ms)"
+        )
+        return
+
+    if upgraded:
+        reason = "meme_generator 版本或表情目录有变化"
+    elif changed:
+        reason = f"{len(changed)} 个文件有变化"
+    else:
+        reason = "距上次检查已超过检查间隔"
+    logger.info(f"正在检查 memes 资源文件 ({reason})...")
+    # 导入 meme_generator 会加载全部表情，放到线程中进行
+    download = await asyncio.to_thread(importlib.import_module, "meme_generator.download")
+    await download.check_resources()
+
+    current = await asyncio.to_thread(_scan, root) if root else {}
+    dirs = await asyncio.to_thread(_meme_dirs, root) if root else []
+    state = {"checked_at": time.time(), "version": version, "dirs": dirs, "files": current}
+
+    def _save():
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps(state), encoding="utf-8")
+
+    await asyncio.to_thread(_save)
+    logger.info(f"memes 资源文件检查完成，耗时 {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from astrbot import logger
+
+from .cache import BlobStore, ByteLRU, Singleflight
+
+
+def make_render_key(
+    meme_key: str,
+    images: list[bytes],
+    texts: list[str],
+    options: dict[str, Any],
+    output: dict[str, Any] | None = None,
+) -> str:
+    """根据表情、全部输入与输出参数 (如压缩参数) 计算缓存键"""
+    payload = json.dumps(
+        {
+            "meme": meme_key,
+            "images": [hashlib.sha256(image).hexdigest() for image in images],
+            "texts": texts,
+            "options": options,
+            "output": output or {},
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class RenderCache:
+    """表情合成结果缓存：内存 LRU + 可选磁盘缓存
+
+    缓存的是压缩后最终发送的图片，相同输入的并发请求共享同一次合成。
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Path | None = None,
+        disk_ttl: float = 7 * 24 * 3600,
+    ):
+        self._memory: ByteLRU[str, bytes] = ByteLRU(max_memory_bytes)
+        self._disk = BlobStore(cache_dir) if cache_dir else None
+        self.disk_ttl = disk_ttl
+        self._flight: Singleflight[str, bytes] = Singleflight()
+
+    async def get(self, key: str) -> bytes | None:
+        """读取缓存"""
+        data = self._memory.get(key)
+        if data is None and self._disk:
+            entry = await asyncio.to_thread(self._disk.read, key)
+            if entry and time.time() - entry[1] < self.disk_ttl:
+                data = entry[0]
+                self._memory.put(key, data, len(data))
+        return data
+
+    async def put(self, key: str, data: bytes):
+        """写入缓存"""
+        self._memory.put(key, data, len(data))
+        if self._disk:
+            try:
+                await asyncio.to_thread(self._disk.write, key, data)
+            except OSError as e:
+                logger.warning(f"表情写入磁盘缓存失败: {e}")
+
+    async def get_or_render(
+        self, key: str, render: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """命中缓存则直接返回，否则合成并写入缓存"""
+        if (data := await self.get(key)) is not None:
+            return data
+
+        async def _render() -> bytes:
+            data = await render()
+            await self.put(key, data)
+            return data
+
+        return await self._flight.do(key, _render)
+
+    async def path(self, key: str) -> Path | None:
+        """磁盘缓存中结果文件的路径，未启用磁盘缓存或未命中时返回 None"""
+        if not self._disk:
+            return None
+        return await asyncio.to_thread(self._disk.blob_path, key)
+
+    async def prune(self) -> int:
+        """清理磁盘上过期的结果"""
+        if not self._disk:
+            return 0
+        return await asyncio.to_thread(self._disk.prune, self.disk_ttl)
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+
+class AdmissionRejected(Exception):
+    """请求被准入控制拒绝
+
+    notify 为 False 时表示同一限流窗口内已提示过，应静默丢弃，避免刷屏时逐条回复。
+    """
+
+    def __init__(self, reason: str, message: str, notify: bool = True):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.notify = notify
+
+
+class JobExpired(Exception):
+    """任务排队超过时限，已被丢弃"""
+
+
+class TokenBucket:
+    """令牌桶：容量 burst，每秒补充 rate 个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, n: float = 1, now: float | None = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens < n:
+            return False
+        self.tokens -= n
+        return True
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+@dataclass
+class _Job:
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class FairScheduler:
+    """合成任务的准入控制与公平调度
+
+    - 准入：按用户、按群的令牌桶限流，排队总数超过 max_queue 时直接拒绝
+    - 调度：每个会话一个队列，按会话轮转出队，单个群刷屏不会挤占其他群
+    - 全局最多 concurrency 个任务同时执行
+    - 排队超过 max_wait 秒的任务在出队时丢弃，请求者多半已不再关心
+    """
+
+    # 令牌桶数量超过该值时清理已回满 (即近期不活跃) 的桶
+    MAX_BUCKETS = 4096
+    # 排队已满时，同一群或用户在该时间 (秒) 内只提示一次
+    QUEUE_FULL_NOTIFY_INTERVAL = 10
+
+    def __init__(
+        self,
+        concurrency: int,
+        user_rate_per_min: float = 0,
+        group_rate_per_min: float = 0,
+        max_queue: int = 64,
+        max_wait: float = 30,
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.user_rate = user_rate_per_min
+        self.group_rate = group_rate_per_min
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.running = 0
+        self.depth = 0
+        self.rejected: Counter[str] = Counter()
+        self.expired = 0
+        self._queues: OrderedDict[str, deque[_Job]] = OrderedDict()
+        self._user_buckets: dict[str, TokenBucket] = {}
+        self._group_buckets: dict[str, TokenBucket] = {}
+        # 提示对象 -> 下次可以再提示的时间
+        self._notify_after: dict[str, float] = {}
+
+    @staticmethod
+    def _bucket(buckets: dict[str, TokenBucket], key: str, rate_per_min: float):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= FairScheduler.MAX_BUCKETS:
+                now = time.monotonic()
+                for stale in [k for k, b in buckets.items() if b.full(now)]:
+                    del buckets[stale]
+            bucket = buckets[key] = TokenBucket(rate_per_min / 60, max(rate_per_min, 1))
+        return bucket
+
+    def _should_notify(self, key: str, interval: float, now: float) -> bool:
+        """同一对象在 interval 秒内只提示一次"""
+        if now < self._notify_after.get(key, 0):
+            return False
+        if len(self._notify_after) >= self.MAX_BUCKETS:
+            self._notify_after = {k: t for k, t in self._notify_after.items() if t > now}
+        self._notify_after[key] = now + interval
+        return True
+
+    def _reject(self, reason: str, message: str, key: str, interval: float, now: float):
+        self.rejected[reason] += 1
+        notify = self._should_notify(f"{reason}:{key}", interval, now)
+        raise AdmissionRejected(reason, message, notify)
+
+    def admit(self, user_id: str, group_id: str = "", cost: int = 1):
+        """准入检查，不通过时抛出 AdmissionRejected"""
+        now = time.monotonic()
+        if self.max_queue and self.depth >= self.max_queue:
+            self._reject(
+                "queue_full",
+                "当前生成表情的人太多了，请稍后再试",
+                group_id or user_id,
+                self.QUEUE_FULL_NOTIFY_INTERVAL,
+                now,
+            )
+        user_bucket = group_bucket = None
+        # 令牌桶从空到满需要 60 秒，同一个桶在此期间只提示一次
+        if self.user_rate > 0:
+            user_bucket = self._bucket(self._user_buckets, user_id, self.user_rate)
+            if not user_bucket.take(cost, now):
+                self._reject("user_rate", "你生成表情太频繁了，请稍后再试", user_id, 60, now)
+        if self.group_rate > 0 and group_id:
+            group_bucket = self._bucket(self._group_buckets, group_id, self.group_rate)
+            if not group_bucket.take(cost, now):
+                # 群被限流时退还用户令牌
+                if user_bucket:
+                    user_bucket.tokens = min(user_bucket.burst, user_bucket.tokens + cost)
+                self._reject(
+                    "group_rate", "本群生成表情太频繁了，请稍后再试", group_id, 60, now
+                )
+
+    @asynccontextmanager
+    async def slot(self, session: str):
+        """排队等待执行槽位，排队超时抛出 JobExpired"""
+        job = _Job(asyncio.get_running_loop().create_future())
+        self._queues.setdefault(session, deque()).append(job)
+        self.depth += 1
+        self._dispatch()
+        try:
+            await job.future
+        except asyncio.CancelledError:
+            # 已分配槽位但等待方被取消，归还槽位
+            if job.future.done() and not job.future.cancelled():
+                self._release()
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.running < self.concurrency and self._queues:
+            session, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            self.depth -= 1
+            # 轮转：该会话还有任务则排到末尾
+            if queue:
+                self._queues.move_to_end(session)
+            else:
+                del self._queues[session]
+            if job.future.done():
+                continue
+            if self.max_wait and now - job.enqueued_at > self.max_wait:
+                self.expired += 1
+                job.future.set_exception(JobExpired())
+                continue
+            self.running += 1
+            job.future.set_result(None)
@@ -0,0 +1,147 @@
+import bisect
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# 直方图桶上界 (毫秒)
+BUCKETS_MS: tuple[float, ...] = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000,
+)  # fmt: skip
+
+
+class Histogram:
+    """固定分桶的耗时直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        """按桶内线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = BUCKETS_MS[i - 1] if i else 0.0
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Stats:
+    """各阶段耗时与事件计数"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages: dict[str, Histogram] = defaultdict(Histogram)
+        # (事件, 表情 key) -> 次数，表情无关的事件 key 为空
+        self.counters: Counter[tuple[str, str]] = Counter()
+        # 表情 key -> [合成次数, 总耗时]
+        self.meme_cost: dict[str, list[float]] = defaultdict(lambda: [0, 0.0])
+        # 瞬时值，如排队数
+        self.gauges: dict[str, float] = {}
+
+    def record(self, stage: str, ms: float, meme_key: str = ""):
+        self.stages[stage].record(ms)
+        if stage == "render" and meme_key:
+            cost = self.meme_cost[meme_key]
+            cost[0] += 1
+            cost[1] += ms
+
+    @contextmanager
+    def timer(self, stage: str, meme_key: str = ""):
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000, meme_key)
+
+    def incr(self, event: str, meme_key: str = "", n: int = 1):
+        self.counters[(event, meme_key)] += n
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def report(self, top: int = 10) -> str:
+        """生成可读的统计报告"""
+        lines = [f"统计时长: {(time.time() - self.started_at) / 3600:.1f} 小时"]
+        lines.append("阶段耗时 (次数 p50/p95/p99 ms):")
+        for stage, hist in sorted(self.stages.items()):
+            lines.append(
+                f"- {stage}: {hist.count} "
+                f"{hist.percentile(0.5):.1f}/{hist.percentile(0.95):.1f}/"
+                f"{hist.percentile(0.99):.1f}"
+            )
+
+        totals: Counter[str] = Counter()
+        for (event, _), n in self.counters.items():
+            totals[event] += n
+        if totals:
+            lines.append("计数:")
+            lines.extend(f"- {event}: {n}" for event, n in sorted(totals.items()))
+
+        if self.gauges:
+            lines.append("当前状态:")
+            lines.extend(f"- {name}: {value:g}" for name, value in sorted(self.gauges.items()))
+
+        if self.meme_cost:
+            lines.append(f"合成总耗时前 {top} 的表情 (次数 平均/总计 ms):")
+            ranked = sorted(self.meme_cost.items(), key=lambda kv: kv[1][1], reverse=True)
+            for key, (n, total) in ranked[:top]:
+                errors = self.counters[("render_error", key)]
+                suffix = f" 失败 {errors}" if errors else ""
+                lines.append(f"- {key}: {int(n)} {total / n:.0f}/{total:.0f}{suffix}")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines = [
+            "# HELP memelite_stage_seconds Latency of meme pipeline stages.",
+            "# TYPE memelite_stage_seconds histogram",
+        ]
+        for stage, hist in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, n in zip((*BUCKETS_MS, float("inf")), hist.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound / 1000:g}"
+                lines.append(
+                    f'memelite_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}'
+                )
+            lines.append(f'memelite_stage_seconds_sum{{stage="{stage}"}} {hist.total / 1000:g}')
+            lines.append(f'memelite_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+
+        lines += [
+            "# HELP memelite_events_total Pipeline events by meme key.",
+            "# TYPE memelite_events_total counter",
+        ]
+        for (event, key), n in sorted(self.counters.items()):
+            lines.append(f'memelite_events_total{{event="{event}",meme="{key}"}} {n}')
+
+        lines += [
+            "# HELP memelite_gauge Current scheduler state.",
+            "# TYPE memelite_gauge gauge",
+        ]
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f'memelite_gauge{{name="{name}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def dump_prometheus(self, path: Path):
+        """写入 Prometheus 文本文件，供 node_exporter textfile 等采集"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.to_prometheus(), encoding="utf-8")
+        tmp.replace(path)
@@ -0,0 +1,23 @@
+"""导入冒烟测试：插件模块必须能在 AstrBot 环境中正常导入
+
+类体中定义了名为 list 的命令处理函数，其后的方法签名若使用内置 list[...] 注解，
+会在导入时报错。需要已安装 AstrBot，否则跳过。
+"""
+
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_import_main():
+    pytest.importorskip("astrbot")
+    package = types.ModuleType("memelite")
+    package.__path__ = [str(ROOT)]  # type: ignore
+    sys.modules.setdefault("memelite", package)
+    main = importlib.import_module("memelite.main")
+    assert main.MemePlugin
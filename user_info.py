@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from astrbot import logger
+from astrbot.api.event import AstrMessageEvent
+
+from .cache import Singleflight
+
+UserInfo = tuple[str, str]
+UserKey = tuple[str, str]
+
+
+class UserInfoCache:
+    """用户信息 (昵称、性别) 缓存
+
+    - 成功结果缓存 ttl 秒，失败结果缓存 negative_ttl 秒
+    - 同一用户的并发查询只会请求一次消息平台
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[AstrMessageEvent, str], Awaitable[UserInfo | None]],
+        ttl: float = 3600,
+        negative_ttl: float = 300,
+        max_entries: int = 4096,
+    ):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._data: OrderedDict[UserKey, tuple[UserInfo | None, float]] = OrderedDict()
+        self._flight: Singleflight[UserKey, UserInfo | None] = Singleflight()
+
+    async def get(self, event: AstrMessageEvent, user_id: str) -> UserInfo | None:
+        """获取用户信息"""
+        key = (event.get_platform_name(), user_id)
+        item = self._data.get(key)
+        if item is not None:
+            info, expires_at = item
+            if time.monotonic() < expires_at:
+                self._data.move_to_end(key)
+                return info
+            del self._data[key]
+        return await self._flight.do(key, lambda: self._load(key, event))
+
+    async def _load(self, key: UserKey, event: AstrMessageEvent) -> UserInfo | None:
+        try:
+            info = await self._fetch(event, key[1])
+        except Exception as e:
+            logger.warning(f"获取用户 {key[1]} 信息失败: {e}")
+            info = None
+        ttl = self.ttl if info else self.negative_ttl
+        self._data[key] = (info, time.monotonic() + ttl)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return info